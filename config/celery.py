@@ -1,6 +1,9 @@
 import os
 
 from celery import Celery
+from celery.signals import task_postrun
+from django.conf import settings
+from django.db import connections
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
 
@@ -9,3 +12,19 @@ app = Celery('config')
 app.config_from_object('django.conf:settings', namespace='CELERY')
 
 app.autodiscover_tasks()
+
+
+@task_postrun.connect
+def release_connections(sender=None, **kwargs):
+    """
+    После задач из CELERY_RELEASE_CONNECTIONS_TASKS соединения с базой
+    закрываются (при пуле возвращаются в него), даже если CONN_MAX_AGE
+    позволяет держать их открытыми.
+    """
+    if sender.name not in settings.CELERY_RELEASE_CONNECTIONS_TASKS:
+        return
+    if getattr(sender.request, 'is_eager', False):
+        return
+    for connection in connections.all(initialized_only=True):
+        if not connection.in_atomic_block:
+            connection.close()
@@ -0,0 +1,21 @@
+from django.conf import settings
+from django.core.checks import Error
+
+LOCAL_CACHE_BACKENDS = {
+    "django.core.cache.backends.locmem.LocMemCache",
+    "django.core.cache.backends.dummy.DummyCache",
+}
+
+
+def check_shared_cache(app_configs, **kwargs):
+    """Версии кэша должны быть видны всем процессам: нужен Redis или memcached."""
+    backend = settings.CACHES["default"]["BACKEND"]
+    if settings.TESTING or backend not in LOCAL_CACHE_BACKENDS:
+        return []
+    return [
+        Error(
+            f"Кэш {backend} не общий для процессов.",
+            hint="Укажите CACHE_BACKEND и CACHE_LOCATION для Redis или memcached.",
+            id="config.E001",
+        )
+    ]
@@ -0,0 +1,58 @@
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from django.conf import settings
+
+DEFAULT_DB = "default"
+
+_replica_reads = ContextVar("replica_reads", default=False)
+
+
+@contextmanager
+def use_replica(enabled=True):
+    """
+    Направляет чтение внутри блока на реплики (или на основную базу при
+    enabled=False). Используется middleware для безопасных запросов
+    и задачами Celery, которым допустимо отставание реплики.
+    """
+    token = _replica_reads.set(enabled)
+    try:
+        yield
+    finally:
+        _replica_reads.reset(token)
+
+
+def replica_reads(func):
+    """Декоратор для задач, читающих данные с реплик."""
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        with use_replica():
+            return func(*args, **kwargs)
+
+    return wrapper
+
+
+class ReplicaRouter:
+    """
+    Запись всегда идет в основную базу. Чтение идет на случайную реплику
+    из DATABASE_REPLICAS, только если оно разрешено через use_replica,
+    иначе в основную базу. Реплики повторяют схему основной базы,
+    миграции выполняются только на ней.
+    """
+
+    def db_for_read(self, model, **hints):
+        if _replica_reads.get() and settings.DATABASE_REPLICAS:
+            return random.choice(settings.DATABASE_REPLICAS)
+        return DEFAULT_DB
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB
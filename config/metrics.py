@@ -0,0 +1,221 @@
+import atexit
+import json
+import logging
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.db import connections
+from django.http import HttpResponse
+from rest_framework.permissions import IsAdminUser
+from rest_framework.views import APIView
+
+logger = logging.getLogger(__name__)
+
+# Границы гистограмм: время ответа в секундах и число SQL-запросов
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+# Значения ряда: число запросов, сумма времени, сумма SQL-запросов, сумма времени SQL,
+# затем корзины времени и корзины числа запросов (последняя корзина каждой - +Inf)
+COUNT, SECONDS, QUERIES, SQL_SECONDS = range(4)
+LATENCY_OFFSET = 4
+QUERY_OFFSET = LATENCY_OFFSET + len(LATENCY_BUCKETS) + 1
+SERIES_SIZE = QUERY_OFFSET + len(QUERY_BUCKETS) + 1
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+_lock = threading.Lock()
+_series = {}
+_last_flush = time.monotonic()
+_file_name = None
+
+
+def _start_process():
+    """
+    Файл процесса называется по pid и времени запуска: процесс, получивший
+    pid завершившегося воркера, не перезапишет его файл. После fork значения
+    родителя не наследуются, иначе они учитывались бы дважды.
+    """
+    global _lock, _file_name
+    _lock = threading.Lock()
+    _series.clear()
+    _file_name = f"{os.getpid()}-{time.time_ns()}.json"
+
+
+_start_process()
+os.register_at_fork(after_in_child=_start_process)
+
+
+class QueryCounter:
+    """Обертка execute_wrapper: число и суммарное время SQL-запросов одного запроса."""
+
+    __slots__ = ("queries", "seconds")
+
+    def __init__(self):
+        self.queries = 0
+        self.seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.seconds += time.perf_counter() - started
+            self.queries += 1
+
+
+@contextmanager
+def count_queries(counter):
+    """Подключает counter к соединениям всех баз (основной и реплик)."""
+    with ExitStack() as stack:
+        for alias in connections:
+            stack.enter_context(connections[alias].execute_wrapper(counter))
+        yield counter
+
+
+def observe(view, method, seconds, counter):
+    """Добавляет запрос к ряду (view, method)."""
+    global _last_flush
+    key = (view, method)
+    with _lock:
+        series = _series.get(key)
+        if series is None:
+            series = _series[key] = [0] * SERIES_SIZE
+        series[COUNT] += 1
+        series[SECONDS] += seconds
+        series[QUERIES] += counter.queries
+        series[SQL_SECONDS] += counter.seconds
+        series[LATENCY_OFFSET + bisect_left(LATENCY_BUCKETS, seconds)] += 1
+        series[QUERY_OFFSET + bisect_left(QUERY_BUCKETS, counter.queries)] += 1
+
+        now = time.monotonic()
+        if (
+            not settings.METRICS_DIR
+            or now - _last_flush < settings.METRICS_FLUSH_INTERVAL
+        ):
+            return
+        _last_flush = now
+        snapshot = _snapshot()
+    _write(snapshot)
+
+
+def collect():
+    """
+    Ряды всех процессов. При заданном METRICS_DIR каждый процесс (воркер gunicorn)
+    раз в METRICS_FLUSH_INTERVAL и при выходе сохраняет свои значения в файл
+    <pid>-<время запуска>.json, а при чтении они суммируются. Значения только
+    растут, поэтому файлы завершившихся процессов продолжают учитываться,
+    а очищается каталог при старте мастера gunicorn (gunicorn.conf.py).
+    У воркера, убитого без выхода, теряется не больше одного интервала.
+    """
+    with _lock:
+        totals = {key: list(values) for key, values in _series.items()}
+    if not settings.METRICS_DIR:
+        return totals
+
+    try:
+        names = os.listdir(settings.METRICS_DIR)
+    except OSError as exc:
+        logger.warning("Метрики других процессов не прочитаны: %s", exc)
+        return totals
+    for name in names:
+        if not name.endswith(".json") or name == _file_name:
+            continue
+        try:
+            with open(os.path.join(settings.METRICS_DIR, name)) as file:
+                rows = json.load(file)
+        except (OSError, ValueError):
+            continue
+        for view, method, values in rows:
+            series = totals.setdefault((view, method), [0] * SERIES_SIZE)
+            for index, value in enumerate(values):
+                series[index] += value
+    return totals
+
+
+def render(totals):
+    """Текстовый формат Prometheus."""
+    lines = []
+    histograms = (
+        (
+            "http_request_duration_seconds",
+            "Время ответа по имени URL.",
+            LATENCY_BUCKETS,
+            LATENCY_OFFSET,
+            SECONDS,
+        ),
+        (
+            "http_request_queries",
+            "Число SQL-запросов на один запрос по имени URL.",
+            QUERY_BUCKETS,
+            QUERY_OFFSET,
+            QUERIES,
+        ),
+    )
+    for metric, help_text, buckets, offset, total in histograms:
+        lines += [f"# HELP {metric} {help_text}", f"# TYPE {metric} histogram"]
+        for (view, method), series in sorted(totals.items()):
+            labels = f'view="{_escape(view)}",method="{method}"'
+            cumulative = 0
+            for index, bound in enumerate(buckets + ("+Inf",)):
+                cumulative += series[offset + index]
+                lines.append(f'{metric}_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f"{metric}_sum{{{labels}}} {series[total]}")
+            lines.append(f"{metric}_count{{{labels}}} {series[COUNT]}")
+
+    metric = "http_request_sql_seconds_total"
+    lines += [
+        f"# HELP {metric} Суммарное время SQL-запросов по имени URL.",
+        f"# TYPE {metric} counter",
+    ]
+    for (view, method), series in sorted(totals.items()):
+        labels = f'view="{_escape(view)}",method="{method}"'
+        lines.append(f"{metric}{{{labels}}} {series[SQL_SECONDS]}")
+    return "\n".join(lines) + "\n"
+
+
+def reset():
+    with _lock:
+        _series.clear()
+
+
+class MetricsAPIView(APIView):
+    """Метрики запросов в формате Prometheus. Доступно только администраторам."""
+
+    permission_classes = [IsAdminUser]
+    swagger_schema = None
+
+    def get(self, request):
+        return HttpResponse(render(collect()), content_type=CONTENT_TYPE)
+
+
+def _snapshot():
+    return [[view, method, list(values)] for (view, method), values in _series.items()]
+
+
+def _write(snapshot):
+    """Ошибка записи не должна прерывать запрос, поэтому только логируется."""
+    path = os.path.join(settings.METRICS_DIR, _file_name)
+    try:
+        os.makedirs(settings.METRICS_DIR, exist_ok=True)
+        with open(f"{path}.tmp", "w") as file:
+            json.dump(snapshot, file)
+        os.replace(f"{path}.tmp", path)
+    except OSError as exc:
+        logger.warning("Метрики не сохранены в %s: %s", path, exc)
+
+
+def _escape(value):
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+@atexit.register
+def _flush_on_exit():
+    if settings.configured and settings.METRICS_DIR and _series:
+        with _lock:
+            snapshot = _snapshot()
+        _write(snapshot)
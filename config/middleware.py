@@ -0,0 +1,143 @@
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+from config.db_router import use_replica
+from config.metrics import QueryCounter, count_queries, observe
+
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Чтение в безопасных запросах идет на реплики. После изменяющего запроса
+    клиент получает cookie, и в течение REPLICA_PIN_SECONDS его запросы
+    читают из основной базы, чтобы видеть собственные изменения.
+    Тело потокового ответа читается по тем же правилам.
+    Поддерживает и синхронные, и асинхронные представления.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        if request.method not in SAFE_METHODS:
+            return self._pin(self.get_response(request))
+
+        replica = not self._is_pinned(request)
+        with use_replica(replica):
+            response = self.get_response(request)
+        return self._route_streaming(response, replica)
+
+    async def __acall__(self, request):
+        if request.method not in SAFE_METHODS:
+            return self._pin(await self.get_response(request))
+
+        replica = not self._is_pinned(request)
+        with use_replica(replica):
+            response = await self.get_response(request)
+        return self._route_streaming(response, replica)
+
+    @staticmethod
+    def _pin(response):
+        pin_seconds = settings.REPLICA_PIN_SECONDS
+        response.set_cookie(
+            settings.REPLICA_PIN_COOKIE,
+            str(int(time.time()) + pin_seconds),
+            max_age=pin_seconds,
+            httponly=True,
+            samesite="Lax",
+        )
+        return response
+
+    @staticmethod
+    def _is_pinned(request):
+        try:
+            pinned_until = int(request.COOKIES.get(settings.REPLICA_PIN_COOKIE, 0))
+        except ValueError:
+            return False
+        return pinned_until > time.time()
+
+    @staticmethod
+    def _route_streaming(response, replica):
+        """
+        Тело потокового ответа читается уже после выхода из middleware,
+        поэтому выбор базы восстанавливается на время получения каждой части.
+        """
+        if not response.streaming:
+            return response
+        if response.is_async:
+            response.streaming_content = _aiterate(response.streaming_content, replica)
+        else:
+            response.streaming_content = _iterate(response.streaming_content, replica)
+        return response
+
+
+def _iterate(content, replica):
+    iterator = iter(content)
+    while True:
+        with use_replica(replica):
+            try:
+                part = next(iterator)
+            except StopIteration:
+                return
+        yield part
+
+
+async def _aiterate(content, replica):
+    iterator = aiter(content)
+    while True:
+        with use_replica(replica):
+            try:
+                part = await anext(iterator)
+            except StopAsyncIteration:
+                return
+        yield part
+
+
+class MetricsMiddleware:
+    """
+    Время ответа, число и время SQL-запросов по имени URL (config.metrics).
+    Для потоковых ответов учитывается время до начала передачи тела.
+    Поддерживает и синхронные, и асинхронные представления.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        started = time.perf_counter()
+        with count_queries(QueryCounter()) as counter:
+            response = self.get_response(request)
+        self._observe(request, time.perf_counter() - started, counter)
+        return response
+
+    async def __acall__(self, request):
+        started = time.perf_counter()
+        with count_queries(QueryCounter()) as counter:
+            response = await self.get_response(request)
+        self._observe(request, time.perf_counter() - started, counter)
+        return response
+
+    @staticmethod
+    def _observe(request, seconds, counter):
+        match = request.resolver_match
+        view = match.view_name if match is not None else "unresolved"
+        observe(view, request.method, seconds, counter)
@@ -1,4 +1,5 @@
 import os
+import sys
 from datetime import timedelta
 from pathlib import Path
 
@@ -30,6 +31,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "config.middleware.MetricsMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -37,6 +39,7 @@ MIDDLEWARE = [
     "django.contrib.auth.middleware.AuthenticationMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
+    "config.middleware.ReplicaRoutingMiddleware",
 ]
 
 ROOT_URLCONF = "config.urls"
@@ -62,24 +65,83 @@ WSGI_APPLICATION = "config.wsgi.application"
 REST_FRAMEWORK = {
     "DEFAULT_FILTER_BACKENDS": ["django_filters.rest_framework.DjangoFilterBackend"],
     "DEFAULT_AUTHENTICATION_CLASSES": (
-        "rest_framework_simplejwt.authentication.JWTAuthentication",
+        "users.authentication.StatelessJWTAuthentication",
     ),
     "DEFAULT_PERMISSION_CLASSES": [
         "rest_framework.permissions.IsAuthenticated",
     ],
 }
 
+# Без пула соединение процесса живет DATABASE_CONN_MAX_AGE секунд.
+# DATABASE_POOL=True включает пул psycopg 3 (размер задается на процесс):
+# соединения возвращаются в пул после каждого запроса и задачи.
+# DATABASE_CONN_HEALTH_CHECKS проверяет соединение перед повторным использованием
+# в обоих режимах.
+DATABASE_POOL = os.getenv("DATABASE_POOL") == "True"
+DATABASE_POOL_OPTIONS = {
+    "min_size": int(os.getenv("DATABASE_POOL_MIN_SIZE") or 2),
+    "max_size": int(os.getenv("DATABASE_POOL_MAX_SIZE") or 10),
+    "timeout": float(os.getenv("DATABASE_POOL_TIMEOUT") or 10),
+    "max_lifetime": float(os.getenv("DATABASE_POOL_MAX_LIFETIME") or 60 * 60),
+}
+
 DATABASES = {
     "default": {
-        "ENGINE": "django.db.backends.postgresql_psycopg2",
+        "ENGINE": "django.db.backends.postgresql",
         "NAME": os.getenv("DATABASE_NAME"),
         "USER": os.getenv("DATABASE_USER"),
         "PASSWORD": os.getenv("DATABASE_PASSWORD"),
         "HOST": os.getenv("DATABASE_HOST"),
         "PORT": os.getenv("DATABASE_PORT", default="5432"),
+        "CONN_MAX_AGE": (
+            0 if DATABASE_POOL else int(os.getenv("DATABASE_CONN_MAX_AGE") or 60)
+        ),
+        "CONN_HEALTH_CHECKS": os.getenv("DATABASE_CONN_HEALTH_CHECKS") != "False",
+        "OPTIONS": {"pool": DATABASE_POOL_OPTIONS} if DATABASE_POOL else {},
     }
 }
 
+TESTING = sys.argv[1:2] == ["test"]
+
+# Реплики для чтения: хосты через запятую, остальные параметры как у default
+DATABASE_REPLICA_HOSTS = os.getenv("DATABASE_REPLICA_HOSTS", default="")
+for number, host in enumerate(filter(None, DATABASE_REPLICA_HOSTS.split(","))):
+    DATABASES[f"replica{number}"] = {
+        **DATABASES["default"],
+        "HOST": host.strip(),
+        "TEST": {"MIRROR": "default"},
+    }
+DATABASE_REPLICAS = [alias for alias in DATABASES if alias != "default"]
+if TESTING:
+    # Реплика для тестов маршрутизации (materials.tests.ReplicaRoutingTestCase),
+    # в DATABASE_REPLICAS не входит: остальные тесты читают из default
+    DATABASES["replica"] = {"ENGINE": "django.db.backends.sqlite3", "NAME": ":memory:"}
+DATABASE_ROUTERS = ["config.db_router.ReplicaRouter"]
+# Сколько секунд после изменяющего запроса клиент читает из основной базы
+REPLICA_PIN_SECONDS = int(os.getenv("REPLICA_PIN_SECONDS") or 10)
+REPLICA_PIN_COOKIE = "db_pin_primary"
+
+# Кэш общий для веб-процессов и воркеров Celery (версии представлений),
+# поэтому локальный кэш процесса допускается только в тестах (config.checks)
+CACHES = {
+    "default": {
+        "BACKEND": os.getenv("CACHE_BACKEND")
+        or (
+            "django.core.cache.backends.locmem.LocMemCache"
+            if TESTING
+            else "django.core.cache.backends.redis.RedisCache"
+        ),
+        "LOCATION": os.getenv("CACHE_LOCATION")
+        or ("" if TESTING else "redis://localhost:6379/1"),
+    }
+}
+
+MATERIALS_CACHE_TIMEOUT = int(os.getenv("MATERIALS_CACHE_TIMEOUT") or 60 * 60)
+
+# 0 отключает кэширование групп пользователя между запросами
+USER_ROLES_CACHE_TIMEOUT = int(os.getenv("USER_ROLES_CACHE_TIMEOUT") or 5 * 60)
+USER_PROFILE_CACHE_TIMEOUT = int(os.getenv("USER_PROFILE_CACHE_TIMEOUT") or 60 * 60)
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         "NAME": "django.contrib.auth.password_validation.UserAttributeSimilarityValidator",
@@ -116,9 +178,34 @@ AUTH_USER_MODEL = "users.User"
 SIMPLE_JWT = {
     "ACCESS_TOKEN_LIFETIME": timedelta(minutes=5),
     "REFRESH_TOKEN_LIFETIME": timedelta(days=1),
+    "TOKEN_OBTAIN_SERIALIZER": "users.serializers.UserTokenObtainPairSerializer",
+    "TOKEN_REFRESH_SERIALIZER": "users.serializers.UserTokenRefreshSerializer",
 }
 
+# Чтение без запроса к таблице пользователей: id, is_staff и роли берутся из токена
+JWT_STATELESS_AUTH = os.getenv("JWT_STATELESS_AUTH") != "False"
+USER_CACHE_TIMEOUT = int(os.getenv("USER_CACHE_TIMEOUT") or 30)
+
+# Число последних платежей в профиле пользователя
+PROFILE_PAYMENTS_LIMIT = int(os.getenv("PROFILE_PAYMENTS_LIMIT") or 5)
+# Размер пачки при потоковой выгрузке списка пользователей (?stream=ndjson)
+USER_LIST_STREAM_CHUNK_SIZE = int(os.getenv("USER_LIST_STREAM_CHUNK_SIZE") or 2000)
+
 STRIPE_API_KEY = os.getenv("STRIPE_API_KEY")
+# Класс шлюза Stripe; users.services.FakeStripeGateway работает без сети
+STRIPE_GATEWAY = os.getenv("STRIPE_GATEWAY") or "users.services.StripeGateway"
+STRIPE_TIMEOUT = float(os.getenv("STRIPE_TIMEOUT") or 10)
+STRIPE_MAX_NETWORK_RETRIES = int(os.getenv("STRIPE_MAX_NETWORK_RETRIES") or 2)
+STRIPE_WEBHOOK_SECRET = os.getenv("STRIPE_WEBHOOK_SECRET")
+# Размер пачки событий вебхука и задержка их применения после первого события, сек.
+STRIPE_EVENTS_BATCH_SIZE = int(os.getenv("STRIPE_EVENTS_BATCH_SIZE") or 1000)
+STRIPE_EVENTS_DELAY = int(os.getenv("STRIPE_EVENTS_DELAY") or 5)
+
+# Метрики запросов (/metrics/): каталог для объединения значений нескольких
+# процессов (воркеров gunicorn) и период сохранения в него, сек.
+# Без каталога отдаются значения только текущего процесса.
+METRICS_DIR = os.getenv("METRICS_DIR")
+METRICS_FLUSH_INTERVAL = float(os.getenv("METRICS_FLUSH_INTERVAL") or 5)
 
 CELERY_TIMEZONE = TIME_ZONE
 CELERY_TASK_TRACK_STARTED = True
@@ -128,11 +215,44 @@ CELERY_BROKER_URL = os.getenv("CELERY_BROKER_URL")
 
 CELERY_RESULT_BACKEND = os.getenv("CELERY_RESULT_BACKEND")
 
+# Редкие длительные задачи сразу отдают соединения с базой (в пул или закрывая их),
+# а не держат их в процессе воркера до следующего запуска
+CELERY_RELEASE_CONNECTIONS_TASKS = {
+    "users.tasks.checking_inactive_users",
+    "materials.tasks.send_course_update_notification",
+    "materials.tasks.flush_course_update_notification",
+    "materials.tasks.send_course_update_chunk",
+    "materials.tasks.send_course_update_digests",
+}
+
+# Размер пачки адресов в одной подзадаче рассылки
+NOTIFICATION_CHUNK_SIZE = int(os.getenv("NOTIFICATION_CHUNK_SIZE") or 500)
+# Окно (в секундах), в котором изменения курса объединяются в одну рассылку
+COURSE_UPDATE_NOTIFICATION_WINDOW = int(
+    os.getenv("COURSE_UPDATE_NOTIFICATION_WINDOW") or 4 * 60 * 60
+)
+
+# Пакетные задачи обслуживания (users.maintenance): размер пачки и пауза в секундах
+MAINTENANCE_BATCH_SIZE = int(os.getenv("MAINTENANCE_BATCH_SIZE") or 5000)
+MAINTENANCE_BATCH_PAUSE = float(os.getenv("MAINTENANCE_BATCH_PAUSE") or 0.1)
+
 CELERY_BEAT_SCHEDULE = {
     'checking_inactive_users': {
         'task': 'users.tasks.checking_inactive_users',
         'schedule': timedelta(days=1),
     },
+    "send_course_update_digests": {
+        "task": "materials.tasks.send_course_update_digests",
+        "schedule": timedelta(days=1),
+    },
+    "reconcile_course_counters": {
+        "task": "materials.tasks.reconcile_course_counters",
+        "schedule": timedelta(days=1),
+    },
+    "apply_stripe_events": {
+        "task": "users.tasks.apply_stripe_events",
+        "schedule": timedelta(minutes=5),
+    },
 }
 
 EMAIL_BACKEND = "django.core.mail.backends.smtp.EmailBackend"
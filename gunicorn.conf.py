@@ -0,0 +1,20 @@
+import os
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+def on_starting(server):
+    """
+    Удаляет файлы метрик (config.metrics) прошлого запуска до старта воркеров,
+    иначе их значения суммировались бы с новыми. Django здесь еще не загружен,
+    поэтому каталог берется из окружения, как в config.settings.
+    """
+    metrics_dir = os.getenv("METRICS_DIR")
+    if not metrics_dir:
+        return
+    os.makedirs(metrics_dir, exist_ok=True)
+    for name in os.listdir(metrics_dir):
+        if name.endswith((".json", ".json.tmp")):
+            os.remove(os.path.join(metrics_dir, name))
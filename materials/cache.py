@@ -0,0 +1,141 @@
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from config.db_router import DEFAULT_DB, use_replica
+from users.models import Subscription
+
+STATS_KEYS = {"hits": "materials:cache:hits", "misses": "materials:cache:misses"}
+
+
+def _version_key(model, pk):
+    return f"materials:{model._meta.label_lower}:{pk}:version"
+
+
+def _subscriptions_key(user_id):
+    return f"materials:subscriptions:{user_id}"
+
+
+def get_versions(model, pks):
+    """Текущие версии объектов; отсутствующая версия создается заново."""
+    keys = {pk: _version_key(model, pk) for pk in pks}
+    found = cache.get_many(keys.values())
+    versions = {}
+    for pk, key in keys.items():
+        if key not in found:
+            cache.add(key, time.time_ns(), None)
+            found[key] = cache.get(key)
+        versions[pk] = found[key]
+    return versions
+
+
+def bump_version(model, *pks):
+    """
+    Делает недействительными все закэшированные представления объектов.
+    Версия меняется после фиксации транзакции: иначе параллельный запрос
+    мог бы закэшировать прежние данные уже под новой версией.
+    """
+    transaction.on_commit(
+        lambda: cache.set_many(
+            {_version_key(model, pk): time.time_ns() for pk in pks}, None
+        )
+    )
+
+
+def get_representations(kind, instances, build):
+    """
+    Возвращает представления объектов из кэша, строя недостающие через build.
+    Ключ включает версию объекта, поэтому после изменения старая запись
+    больше не читается и вытесняется по таймауту.
+    """
+    if not instances:
+        return []
+    model = type(instances[0])
+    versions = get_versions(model, [instance.pk for instance in instances])
+    keys = [
+        f"materials:{kind}:{instance.pk}:{versions[instance.pk]}"
+        for instance in instances
+    ]
+    cached = cache.get_many(keys)
+
+    representations = {}
+    missing = {}
+    for key, instance in zip(keys, instances):
+        if key in cached:
+            representations[key] = cached[key]
+        else:
+            missing[key] = instance
+    if missing:
+        built = _build_from_primary(model, missing, build)
+        cache.set_many(built, settings.MATERIALS_CACHE_TIMEOUT)
+        for key, instance in missing.items():
+            representations[key] = built[key] if key in built else build(instance)
+
+    _count("hits", len(instances) - len(missing))
+    _count("misses", len(missing))
+    return [representations[key] for key in keys]
+
+
+def _build_from_primary(model, missing, build):
+    """
+    Представления для кэша строятся по данным основной базы: реплика может
+    отставать, и ее данные остались бы в кэше под актуальной версией.
+    Объекты, уже удаленные из основной базы, не кэшируются.
+    """
+    replica_pks = [
+        instance.pk for instance in missing.values() if instance._state.db != DEFAULT_DB
+    ]
+    primary = model._base_manager.using(DEFAULT_DB).in_bulk(replica_pks)
+    built = {}
+    with use_replica(False):
+        for key, instance in missing.items():
+            if instance._state.db != DEFAULT_DB:
+                instance = primary.get(instance.pk)
+            if instance is not None:
+                built[key] = build(instance)
+    return built
+
+
+def get_subscribed_course_ids(user):
+    """
+    Множество id курсов, на которые подписан пользователь. Как и все
+    кэшируемые данные, при промахе читается из основной базы.
+    """
+    key = _subscriptions_key(user.pk)
+    course_ids = cache.get(key)
+    if course_ids is None:
+        with use_replica(False):
+            course_ids = set(
+                Subscription.objects.filter(user_id=user.pk).values_list(
+                    "course_id", flat=True
+                )
+            )
+        cache.set(key, course_ids, settings.MATERIALS_CACHE_TIMEOUT)
+    return course_ids
+
+
+def invalidate_subscriptions(user_id):
+    """
+    Сбрасывает кэш подписок после фиксации транзакции: сброшенный раньше кэш
+    параллельный запрос успел бы заполнить еще прежними подписками.
+    """
+    transaction.on_commit(lambda: cache.delete(_subscriptions_key(user_id)))
+
+
+def get_stats():
+    """Счетчики попаданий и промахов кэша представлений."""
+    values = cache.get_many(STATS_KEYS.values())
+    return {name: values.get(key, 0) for name, key in STATS_KEYS.items()}
+
+
+def _count(name, value):
+    if not value:
+        return
+    key = STATS_KEYS[name]
+    if not cache.add(key, value, None):
+        try:
+            cache.incr(key, value)
+        except ValueError:
+            cache.set(key, value, None)
@@ -0,0 +1,68 @@
+from django.db.models import Count, F, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+
+from materials.cache import bump_version
+from materials.models import Course, Lesson
+from users.models import Subscription
+
+
+def _count_subquery(queryset):
+    return Coalesce(
+        Subquery(
+            queryset.filter(course=OuterRef("pk"))
+            .order_by()
+            .values("course")
+            .annotate(count=Count("pk"))
+            .values("count")
+        ),
+        0,
+    )
+
+
+def actual_lessons_count():
+    return _count_subquery(Lesson.objects.all())
+
+
+def actual_subscribers_count():
+    return _count_subquery(Subscription.objects.filter(user__isnull=False))
+
+
+def change_counter(field, deltas):
+    """
+    Атомарно изменяет счетчик field курсов на величины из deltas {course_id: delta}
+    и сбрасывает закэшированные представления этих курсов.
+    """
+    deltas = {pk: delta for pk, delta in deltas.items() if pk is not None and delta}
+    for pk, delta in deltas.items():
+        Course.objects.filter(pk=pk).update(**{field: F(field) + delta})
+    if deltas:
+        bump_version(Course, *deltas)
+
+
+def shift_counter(field, pks, delta):
+    """Одним UPDATE изменяет счетчик field на delta у всех курсов из pks."""
+    if pks:
+        Course.objects.filter(pk__in=pks).update(**{field: F(field) + delta})
+        bump_version(Course, *pks)
+
+
+def repair_counters(queryset):
+    """Исправляет счетчики курсов из queryset, разошедшиеся с фактическими."""
+    drifted = list(
+        queryset.annotate(
+            actual_lessons=actual_lessons_count(),
+            actual_subscribers=actual_subscribers_count(),
+        )
+        .filter(
+            ~Q(lessons_count=F("actual_lessons"))
+            | ~Q(subscribers_count=F("actual_subscribers"))
+        )
+        .values_list("pk", flat=True)
+    )
+    if drifted:
+        Course.objects.filter(pk__in=drifted).update(
+            lessons_count=actual_lessons_count(),
+            subscribers_count=actual_subscribers_count(),
+        )
+        bump_version(Course, *drifted)
+    return len(drifted)
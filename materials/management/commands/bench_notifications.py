@@ -0,0 +1,104 @@
+import time
+
+from django.core import mail
+from django.core.mail import send_mail
+from django.core.mail.backends import locmem
+from django.core.management import BaseCommand
+from django.db import transaction
+from django.test.utils import override_settings
+
+from config.celery import app as celery_app
+from materials.models import Course
+from materials.tasks import send_course_update_notification
+from users.models import Subscription, User
+
+
+class SlowConnectionEmailBackend(locmem.EmailBackend):
+    """Почтовый бэкенд в памяти, имитирующий задержку открытия SMTP-соединения."""
+
+    connect_latency = 0.0
+
+    def open(self):
+        if getattr(self, "_opened", False):
+            return False
+        time.sleep(self.connect_latency)
+        self._opened = True
+        return True
+
+    def close(self):
+        self._opened = False
+
+    def send_messages(self, messages):
+        opened = self.open()
+        try:
+            return super().send_messages(messages)
+        finally:
+            if opened:
+                self.close()
+
+
+class Command(BaseCommand):
+    """
+    Сравнение рассылки уведомлений об обновлении курса: по одному письму
+    с отдельным соединением на подписчика и пачками через одно соединение.
+    Используется почтовый бэкенд в памяти, данные откатываются после замеров.
+    Пример использования:
+        python manage.py bench_notifications --subscribers 50000
+    """
+
+    help = "Замер рассылки уведомлений об обновлении курса"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--subscribers", type=int, default=10_000)
+        parser.add_argument("--connect-latency-ms", type=float, default=1.0)
+
+    def handle(self, *args, **options):
+        SlowConnectionEmailBackend.connect_latency = (
+            options["connect_latency_ms"] / 1000
+        )
+        backend = f"{__name__}.SlowConnectionEmailBackend"
+        always_eager = celery_app.conf.task_always_eager
+        celery_app.conf.task_always_eager = True
+        try:
+            with override_settings(EMAIL_BACKEND=backend), transaction.atomic():
+                course = self._seed(options["subscribers"])
+                mail.outbox = []
+                legacy = self._measure(self._send_one_by_one, course)
+                mail.outbox = []
+                chunked = self._measure(send_course_update_notification, course.pk)
+                transaction.set_rollback(True)
+        finally:
+            celery_app.conf.task_always_eager = always_eager
+
+        self.stdout.write(f"По одному письму: {legacy:.2f} с")
+        self.stdout.write(f"Пачками:          {chunked:.2f} с")
+
+    @staticmethod
+    def _seed(count, batch_size=5_000):
+        course = Course.objects.create(name="bench_notifications")
+        for start in range(0, count, batch_size):
+            users = User.objects.bulk_create(
+                User(email=f"bench{number}@example.com")
+                for number in range(start, min(start + batch_size, count))
+            )
+            Subscription.objects.bulk_create(
+                Subscription(user=user, course=course) for user in users
+            )
+        return course
+
+    @staticmethod
+    def _send_one_by_one(course):
+        """Прежняя реализация: запрос пользователя и соединение на каждое письмо."""
+        for subscriber in Subscription.objects.filter(course=course):
+            send_mail(
+                subject=f"Обновление курса {course.name}",
+                message=f'Курс "{course.name}" был обновлен.',
+                from_email=None,
+                recipient_list=[subscriber.user.email],
+            )
+
+    @staticmethod
+    def _measure(func, *args):
+        started = time.perf_counter()
+        func(*args)
+        return time.perf_counter() - started
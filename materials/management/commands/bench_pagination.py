@@ -0,0 +1,92 @@
+import json
+import statistics
+import time
+
+from django.core.management import BaseCommand
+from django.db import transaction
+from rest_framework.pagination import Cursor
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from materials.models import Course, Lesson
+from materials.paginations import CustomPagination, LessonKeysetPagination
+
+
+class Command(BaseCommand):
+    """
+    Сравнение времени получения страницы списка уроков на разной глубине
+    для постраничной и курсорной пагинации.
+    Данные создаются во временной транзакции и откатываются после замеров.
+    Пример использования:
+        python manage.py bench_pagination --rows 1000000
+    """
+
+    help = "Замер времени получения N-й страницы уроков для двух режимов пагинации"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=1_000_000)
+        parser.add_argument("--page-size", type=int, default=10)
+        parser.add_argument("--repeat", type=int, default=5)
+
+    def handle(self, *args, **options):
+        rows = options["rows"]
+        page_size = options["page_size"]
+        with transaction.atomic():
+            course = self._seed(rows)
+            queryset = Lesson.objects.filter(course=course)
+            last_page = max(rows // page_size, 1)
+            pages = sorted({1, last_page // 100 or 1, last_page // 2, last_page})
+
+            self.stdout.write(
+                f"{'page':>10} {'page-number, ms':>16} {'keyset, ms':>12}"
+            )
+            for page in pages:
+                page_number_ms = self._measure(
+                    CustomPagination,
+                    queryset.order_by("id"),
+                    f"/?page={page}&page_size={page_size}",
+                    options["repeat"],
+                )
+                keyset_ms = self._measure(
+                    LessonKeysetPagination,
+                    queryset,
+                    self._cursor_url(queryset, page, page_size),
+                    options["repeat"],
+                )
+                self.stdout.write(
+                    f"{page:>10} {page_number_ms:>16.2f} {keyset_ms:>12.2f}"
+                )
+            transaction.set_rollback(True)
+
+    def _seed(self, rows, batch_size=10_000):
+        course = Course.objects.create(name="bench_pagination")
+        for start in range(0, rows, batch_size):
+            Lesson.objects.bulk_create(
+                Lesson(name=f"Урок {number}", course=course)
+                for number in range(start, min(start + batch_size, rows))
+            )
+        return course
+
+    @staticmethod
+    def _cursor_url(queryset, page, page_size):
+        if page == 1:
+            return f"/?page_size={page_size}"
+        last_id = queryset.order_by("id").values_list("id", flat=True)[
+            (page - 1) * page_size - 1
+        ]
+        paginator = LessonKeysetPagination()
+        paginator.base_url = f"/?page_size={page_size}"
+        position = json.dumps([str(last_id)])
+        return paginator.encode_cursor(
+            Cursor(offset=0, reverse=False, position=position)
+        )
+
+    @staticmethod
+    def _measure(pagination_class, queryset, url, repeat):
+        request = Request(APIRequestFactory().get(url, SERVER_NAME="localhost"))
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            list(pagination_class().paginate_queryset(queryset, request))
+            timings.append((time.perf_counter() - started) * 1000)
+        return statistics.median(timings)
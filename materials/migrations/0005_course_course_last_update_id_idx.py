@@ -0,0 +1,21 @@
+# Generated by Django 5.2.1 on 2026-10-17 11:39
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("materials", "0004_course_last_update"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="course",
+            index=models.Index(
+                fields=["last_update", "id"], name="course_last_update_id_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.1 on 2026-10-17 12:05
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("materials", "0005_course_course_last_update_id_idx"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="lesson",
+            name="last_update",
+            field=models.DateTimeField(
+                auto_now=True,
+                default=django.utils.timezone.now,
+                verbose_name="Последнее обновление",
+            ),
+            preserve_default=False,
+        ),
+    ]
@@ -0,0 +1,64 @@
+# Generated by Django 5.2.1 on 2026-10-17 12:02
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_subquery(queryset):
+    return Coalesce(
+        Subquery(
+            queryset.filter(course=OuterRef("pk"))
+            .order_by()
+            .values("course")
+            .annotate(count=Count("pk"))
+            .values("count")
+        ),
+        0,
+    )
+
+
+def fill_counters(apps, schema_editor):
+    Course = apps.get_model("materials", "Course")
+    Lesson = apps.get_model("materials", "Lesson")
+    Subscription = apps.get_model("users", "Subscription")
+    Course.objects.update(
+        lessons_count=count_subquery(Lesson.objects.all()),
+        subscribers_count=count_subquery(
+            Subscription.objects.filter(user__isnull=False)
+        ),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("materials", "0006_lesson_last_update"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("users", "0003_subscription"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="course",
+            name="lessons_count",
+            field=models.IntegerField(
+                default=0, editable=False, verbose_name="Количество уроков"
+            ),
+        ),
+        migrations.AddField(
+            model_name="course",
+            name="subscribers_count",
+            field=models.IntegerField(
+                default=0, editable=False, verbose_name="Количество подписчиков"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="course",
+            index=models.Index(
+                fields=["subscribers_count", "id"], name="course_popularity_idx"
+            ),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.1 on 2026-10-17 12:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("materials", "0007_course_counters"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="course",
+            name="notification_scheduled_at",
+            field=models.DateTimeField(
+                editable=False, null=True, verbose_name="Рассылка запланирована"
+            ),
+        ),
+        migrations.AddField(
+            model_name="course",
+            name="update_pending_since",
+            field=models.DateTimeField(
+                editable=False, null=True, verbose_name="Изменен с"
+            ),
+        ),
+    ]
@@ -0,0 +1,92 @@
+import hashlib
+
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date
+from rest_framework.response import Response
+
+
+class ConditionalGetMixin:
+    """
+    Условные GET-запросы для списка и детальной страницы.
+    ETag и Last-Modified считаются по отметкам времени загруженных объектов
+    до сериализации, поэтому при совпадении с If-None-Match / If-Modified-Since
+    клиент получает 304 без построения тела ответа.
+    """
+
+    last_modified_field = "last_update"
+    # Поля, которые меняются без обновления last_modified_field (счетчики).
+    # Они входят в ETag, а Last-Modified для таких объектов не выдается
+    etag_fields = ()
+
+    def get_etag_parts(self, obj):
+        return (
+            obj.pk,
+            getattr(obj, self.last_modified_field).isoformat(),
+            *(getattr(obj, field) for field in self.etag_fields),
+        )
+
+    def get_list_etag_parts(self):
+        # Для постраничной пагинации в ответ входит общее количество записей
+        page = getattr(self.paginator, "page", None)
+        paginator = getattr(page, "paginator", None)
+        return paginator.count if paginator is not None else None
+
+    def get_not_modified_response(self, objects, *extra, with_last_modified=True):
+        """
+        Для списков Last-Modified не выдается: удаление записей и изменение
+        подписок не сдвигают максимальную дату на странице, поэтому списки
+        сравниваются только по ETag.
+        """
+        parts = (self.request.user.pk, extra, [self.get_etag_parts(o) for o in objects])
+        etag = '"%s"' % hashlib.sha256(repr(parts).encode()).hexdigest()
+        last_modified = None
+        if with_last_modified and objects:
+            # Заголовок Last-Modified имеет точность до секунды
+            last_modified = int(
+                max(
+                    getattr(obj, self.last_modified_field) for obj in objects
+                ).timestamp()
+            )
+        self._conditional_headers = (etag, last_modified)
+        return get_conditional_response(
+            self.request, etag=etag, last_modified=last_modified
+        )
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        page = self.paginate_queryset(queryset)
+        objects = list(queryset) if page is None else page
+
+        not_modified = self.get_not_modified_response(
+            objects, self.get_list_etag_parts(), with_last_modified=False
+        )
+        if not_modified is not None:
+            return not_modified
+
+        serializer = self.get_serializer(objects, many=True)
+        if page is not None:
+            return self.get_paginated_response(serializer.data)
+        return Response(serializer.data)
+
+    def retrieve(self, request, *args, **kwargs):
+        instance = self.get_object()
+
+        not_modified = self.get_not_modified_response(
+            [instance], with_last_modified=not self.etag_fields
+        )
+        if not_modified is not None:
+            return not_modified
+
+        serializer = self.get_serializer(instance)
+        return Response(serializer.data)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        headers = getattr(self, "_conditional_headers", None)
+        if headers is not None and response.status_code in (200, 304):
+            etag, last_modified = headers
+            response["ETag"] = etag
+            if last_modified is not None:
+                response["Last-Modified"] = http_date(last_modified)
+            patch_vary_headers(response, ["Authorization"])
+        return response
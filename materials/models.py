@@ -14,11 +14,36 @@ class Course(models.Model):
         blank=True,
         verbose_name="Создатель",
     )
-    last_update = models.DateTimeField(auto_now=True, verbose_name="Последнее обновление")
+    last_update = models.DateTimeField(
+        auto_now=True, verbose_name="Последнее обновление"
+    )
+    # Счетчики поддерживаются сигналами (materials.signals)
+    # и сверяются задачей reconcile_course_counters
+    lessons_count = models.IntegerField(
+        default=0, editable=False, verbose_name="Количество уроков"
+    )
+    subscribers_count = models.IntegerField(
+        default=0, editable=False, verbose_name="Количество подписчиков"
+    )
+    # Отметки отложенной рассылки об обновлении (materials.services)
+    update_pending_since = models.DateTimeField(
+        null=True, editable=False, verbose_name="Изменен с"
+    )
+    notification_scheduled_at = models.DateTimeField(
+        null=True, editable=False, verbose_name="Рассылка запланирована"
+    )
 
     class Meta:
         verbose_name = "Курс"
         verbose_name_plural = "Курсы"
+        indexes = [
+            models.Index(
+                fields=["last_update", "id"], name="course_last_update_id_idx"
+            ),
+            models.Index(
+                fields=["subscribers_count", "id"], name="course_popularity_idx"
+            ),
+        ]
 
     def __str__(self):
         return self.name
@@ -46,6 +71,9 @@ class Lesson(models.Model):
         blank=True,
         verbose_name="Создатель",
     )
+    last_update = models.DateTimeField(
+        auto_now=True, verbose_name="Последнее обновление"
+    )
 
     class Meta:
         verbose_name = "Урок"
@@ -1,7 +1,149 @@
-from rest_framework.pagination import PageNumberPagination
+import json
+
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import Cursor, CursorPagination, PageNumberPagination
 
 
 class CustomPagination(PageNumberPagination):
     page_size = 5
     page_size_query_param = "page_size"
     max_page_size = 10
+
+
+class KeysetPagination(CursorPagination):
+    """
+    Курсорная пагинация по составному ключу сортировки.
+    Следующая страница выбирается условием на значения ключа последней записи,
+    поэтому глубина страницы не влияет на стоимость запроса (нет COUNT(*) и OFFSET).
+    Последнее поле ключа должно быть уникальным (обычно это id).
+    """
+
+    page_size = 5
+    page_size_query_param = "page_size"
+    max_page_size = 10
+    ordering = ("id",)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.base_url = request.build_absolute_uri()
+        self.cursor = self.decode_cursor(request)
+
+        reverse = self.cursor is not None and self.cursor.reverse
+        ordering = self._get_ordering(reverse)
+        queryset = queryset.order_by(*ordering)
+        if self.cursor is not None:
+            position = self._decode_position(self.cursor.position)
+            try:
+                queryset = queryset.filter(
+                    self._get_position_filter(ordering, position)
+                )
+            except (DjangoValidationError, ValueError, TypeError):
+                # Значения ключа в подмененном курсоре не приводятся к типам полей
+                raise NotFound(self.invalid_cursor_message)
+
+        results = list(queryset[: self.page_size + 1])
+        has_more = len(results) > self.page_size
+        self.page = results[: self.page_size]
+
+        if reverse:
+            self.page.reverse()
+            self.has_next = True
+            self.has_previous = has_more
+        else:
+            self.has_next = has_more
+            self.has_previous = self.cursor is not None
+        return self.page
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        position = self._get_position_from_instance(self.page[-1], self.ordering)
+        return self.encode_cursor(Cursor(offset=0, reverse=False, position=position))
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        position = self._get_position_from_instance(self.page[0], self.ordering)
+        return self.encode_cursor(Cursor(offset=0, reverse=True, position=position))
+
+    def _get_ordering(self, reverse):
+        if not reverse:
+            return self.ordering
+        return tuple(
+            name[1:] if name.startswith("-") else f"-{name}" for name in self.ordering
+        )
+
+    def _decode_position(self, position):
+        try:
+            values = json.loads(position)
+        except (TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(values, list) or len(values) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+        return values
+
+    @staticmethod
+    def _get_position_filter(ordering, position):
+        """(a, b) > (x, y) раскрывается в a > x OR (a = x AND b > y)."""
+        condition = Q()
+        equal = Q()
+        for name, value in zip(ordering, position):
+            field_name = name.lstrip("-")
+            lookup = "lt" if name.startswith("-") else "gt"
+            condition |= equal & Q(**{f"{field_name}__{lookup}": value})
+            equal &= Q(**{field_name: value})
+        return condition
+
+    def _get_position_from_instance(self, instance, ordering):
+        # value_to_string сохраняет микросекунды у дат, иначе курсор терял бы записи
+        values = [
+            instance._meta.get_field(name.lstrip("-")).value_to_string(instance)
+            for name in ordering
+        ]
+        return json.dumps(values)
+
+
+class CourseKeysetPagination(KeysetPagination):
+    ordering = ("-last_update", "-id")
+
+
+class LessonKeysetPagination(KeysetPagination):
+    ordering = ("id",)
+
+
+class PaymentKeysetPagination(KeysetPagination):
+    ordering = ("-payment_date", "-id")
+
+
+class UserKeysetPagination(KeysetPagination):
+    ordering = ("id",)
+    page_size = 100
+    max_page_size = 1000
+
+
+class PaginationModeMixin:
+    """
+    Позволяет клиенту выбрать режим пагинации параметром запроса
+    ?pagination=cursor. По умолчанию используется pagination_class.
+    """
+
+    pagination_mode_query_param = "pagination"
+    cursor_pagination_class = None
+
+    @property
+    def paginator(self):
+        if not hasattr(self, "_paginator"):
+            pagination_class = self.pagination_class
+            request = getattr(self, "request", None)
+            if (
+                request is not None
+                and self.cursor_pagination_class is not None
+                and request.query_params.get(self.pagination_mode_query_param)
+                == "cursor"
+            ):
+                pagination_class = self.cursor_pagination_class
+            self._paginator = None if pagination_class is None else pagination_class()
+        return self._paginator
@@ -1,38 +1,127 @@
+from django.db.models import Manager, Prefetch, prefetch_related_objects
 from rest_framework import serializers
-from rest_framework.fields import SerializerMethodField
 
+from materials.cache import get_representations
 from materials.models import Course, Lesson
 from materials.validators import validate_link
 
 
-class CourseSerializer(serializers.ModelSerializer):
+class CachedListSerializer(serializers.ListSerializer):
+    """Читает представления всех элементов из кэша одним обращением."""
+
+    def to_representation(self, data):
+        iterable = data.all() if isinstance(data, Manager) else data
+        return self.child.to_cached_representation(list(iterable))
+
+
+class CachedRepresentationMixin:
+    """
+    Кэширует представление объекта по его id и версии (materials.cache).
+    Поля из user_fields зависят от пользователя, в кэш не попадают
+    и вычисляются заново при каждом запросе. Представление строится без
+    request, поэтому ссылки на файлы хранятся относительными и дополняются
+    хостом текущего запроса при чтении.
+    """
+
+    cache_kind = None
+    user_fields = ()
+
+    def to_representation(self, instance):
+        return self.to_cached_representation([instance])[0]
+
+    def to_cached_representation(self, instances):
+        representations = get_representations(
+            self.cache_kind, instances, self._build_representation
+        )
+        request = self.context.get("request")
+        return [
+            self._add_request_fields(data, instance, request)
+            for data, instance in zip(representations, instances)
+        ]
+
+    def _build_representation(self, instance):
+        # Контекст общий для вложенных сериализаторов, поэтому и они
+        # строятся без request
+        request = self.context.pop("request", None)
+        try:
+            data = super().to_representation(instance)
+        finally:
+            if request is not None:
+                self.context["request"] = request
+        for field_name in self.user_fields:
+            data.pop(field_name, None)
+        return data
+
+    def _add_request_fields(self, data, instance, request):
+        data = dict(data)
+        for field_name in self.user_fields:
+            field = self.fields[field_name]
+            data[field_name] = field.to_representation(field.get_attribute(instance))
+        if request is not None:
+            data = self._absolute_urls(data, request)
+        return data
+
+    def _absolute_urls(self, data, request):
+        for field_name, field in self.fields.items():
+            value = data.get(field_name)
+            if not value:
+                continue
+            if isinstance(field, serializers.FileField):
+                data[field_name] = request.build_absolute_uri(value)
+            elif isinstance(field, serializers.ListSerializer) and isinstance(
+                field.child, CachedRepresentationMixin
+            ):
+                data[field_name] = [
+                    field.child._absolute_urls(dict(item), request) for item in value
+                ]
+        return data
+
+
+class CourseSerializer(CachedRepresentationMixin, serializers.ModelSerializer):
     is_subscribed = serializers.SerializerMethodField()
 
+    cache_kind = "course"
+    user_fields = ("is_subscribed",)
+
     class Meta:
         model = Course
-        fields = "__all__"
+        # Служебные отметки рассылки (materials.services) не выводятся
+        exclude = ("update_pending_since", "notification_scheduled_at")
+        list_serializer_class = CachedListSerializer
 
     def get_is_subscribed(self, obj):
+        subscribed_course_ids = self.context.get("subscribed_course_ids")
+        if subscribed_course_ids is not None:
+            return obj.pk in subscribed_course_ids
         request = self.context.get("request")
         if request and request.user.is_authenticated:
             return obj.subscription.filter(user=request.user).exists()
         return False
 
 
-class LessonSerializer(serializers.ModelSerializer):
+class LessonSerializer(CachedRepresentationMixin, serializers.ModelSerializer):
     video_link = serializers.CharField(validators=[validate_link])
 
+    cache_kind = "lesson"
+
     class Meta:
         model = Lesson
         fields = "__all__"
+        list_serializer_class = CachedListSerializer
 
 
-class CourseDetailSerializer(serializers.ModelSerializer):
-    lessons_count = SerializerMethodField()
+class CourseDetailSerializer(CachedRepresentationMixin, serializers.ModelSerializer):
     lessons = LessonSerializer(many=True, read_only=True)
 
-    def get_lessons_count(self, obj):
-        return Lesson.objects.filter(course=obj).count()
+    cache_kind = "course_detail"
+
+    def _build_representation(self, instance):
+        # Уроки загружаются только при промахе кэша, одним запросом
+        # и только с полями, которые выводит LessonSerializer
+        lesson_fields = [field.source for field in LessonSerializer().fields.values()]
+        lessons = Lesson.objects.only(*lesson_fields).order_by("pk")
+        prefetch_related_objects([instance], Prefetch("lessons", queryset=lessons))
+        return super()._build_representation(instance)
 
     class Meta:
         model = Course
@@ -40,5 +129,6 @@ class CourseDetailSerializer(serializers.ModelSerializer):
             "name",
             "description",
             "lessons_count",
+            "subscribers_count",
             "lessons",
         )
@@ -0,0 +1,52 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from materials.models import Course
+from materials.tasks import flush_course_update_notification
+
+
+def schedule_course_update_notification(course_id):
+    """
+    Помечает курс измененным и после фиксации транзакции планирует одну
+    отложенную рассылку на окно COURSE_UPDATE_NOTIFICATION_WINDOW.
+    Изменения внутри окна поглощаются уже запланированной рассылкой.
+    Отметки хранятся в курсе, поэтому видны воркерам Celery, а при откате
+    транзакции откатываются вместе с изменением.
+    """
+    Course.objects.filter(pk=course_id, update_pending_since__isnull=True).update(
+        update_pending_since=timezone.now()
+    )
+    transaction.on_commit(lambda: _schedule_flush(course_id))
+
+
+def _schedule_flush(course_id):
+    window = settings.COURSE_UPDATE_NOTIFICATION_WINDOW
+    now = timezone.now()
+    # Условный UPDATE атомарен: из конкурентных изменений рассылку планирует
+    # только одно. Отметка старше двух окон остается от потерянной задачи.
+    scheduled = Course.objects.filter(
+        Q(notification_scheduled_at__isnull=True)
+        | Q(notification_scheduled_at__lt=now - timedelta(seconds=window * 2)),
+        pk=course_id,
+    ).update(notification_scheduled_at=now)
+    if scheduled:
+        flush_course_update_notification.apply_async((course_id,), countdown=window)
+
+
+def pop_course_update(course_id):
+    """Снимает отметку об изменении курса и открывает новое окно."""
+    with transaction.atomic():
+        pending_since = (
+            Course.objects.select_for_update()
+            .filter(pk=course_id)
+            .values_list("update_pending_since", flat=True)
+            .first()
+        )
+        Course.objects.filter(pk=course_id).update(
+            update_pending_since=None, notification_scheduled_at=None
+        )
+    return pending_since
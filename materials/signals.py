@@ -0,0 +1,97 @@
+from django.db.models import F
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from materials.cache import bump_version, invalidate_subscriptions
+from materials.counters import change_counter
+from materials.models import Course, Lesson
+from users.models import Subscription, User
+
+
+@receiver(pre_save, sender=Lesson)
+def remember_lesson_course(sender, instance, **kwargs):
+    """Запоминает прежний курс урока, чтобы обновить оба курса при переносе."""
+    instance._previous_course_id = None
+    if instance.pk is not None:
+        instance._previous_course_id = (
+            Lesson.objects.filter(pk=instance.pk)
+            .values_list("course_id", flat=True)
+            .first()
+        )
+
+
+@receiver(post_save, sender=Lesson)
+@receiver(post_delete, sender=Lesson)
+def touch_lesson_course(sender, instance, signal, created=False, **kwargs):
+    """
+    Изменение урока считается изменением его курса. Счетчик уроков
+    меняется в том же UPDATE, что и дата обновления курса.
+    """
+    previous_course_id = getattr(instance, "_previous_course_id", None)
+    if signal is post_delete:
+        deltas = {instance.course_id: -1}
+    elif created:
+        deltas = {instance.course_id: 1}
+    elif previous_course_id not in (None, instance.course_id):
+        deltas = {previous_course_id: -1, instance.course_id: 1}
+    else:
+        deltas = {instance.course_id: 0}
+
+    now = timezone.now()
+    for course_id, delta in deltas.items():
+        Course.objects.filter(pk=course_id).update(
+            last_update=now, lessons_count=F("lessons_count") + delta
+        )
+    bump_version(Lesson, instance.pk)
+    bump_version(Course, *deltas)
+
+
+@receiver(post_save, sender=Course)
+@receiver(post_delete, sender=Course)
+def invalidate_course_cache(sender, instance, **kwargs):
+    bump_version(Course, instance.pk)
+
+
+@receiver(pre_save, sender=Subscription)
+def remember_subscription_course(sender, instance, **kwargs):
+    instance._previous_counted = None
+    if instance.pk is not None:
+        instance._previous_counted = (
+            Subscription.objects.filter(pk=instance.pk, user__isnull=False)
+            .values_list("course_id", flat=True)
+            .first()
+        )
+
+
+@receiver(post_save, sender=Subscription)
+@receiver(post_delete, sender=Subscription)
+def update_subscription_counters(sender, instance, signal, created=False, **kwargs):
+    """Подписка без пользователя не учитывается в subscribers_count."""
+    counted = instance.course_id if instance.user_id is not None else None
+    deltas = {}
+    if signal is post_delete:
+        deltas[counted] = -1
+    else:
+        previous = None if created else instance._previous_counted
+        if previous != counted:
+            deltas[previous] = deltas.get(previous, 0) - 1
+            deltas[counted] = deltas.get(counted, 0) + 1
+    change_counter("subscribers_count", deltas)
+
+    if instance.user_id is not None:
+        invalidate_subscriptions(instance.user_id)
+
+
+@receiver(pre_delete, sender=User)
+def uncount_user_subscriptions(sender, instance, **kwargs):
+    """Подписки удаляемого пользователя обнуляются в обход сигналов (SET_NULL)."""
+    change_counter(
+        "subscribers_count",
+        {
+            course_id: -1
+            for course_id in Subscription.objects.filter(user=instance).values_list(
+                "course_id", flat=True
+            )
+        },
+    )
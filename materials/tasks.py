@@ -1,24 +1,149 @@
+from itertools import groupby, islice
+from operator import itemgetter
+from smtplib import SMTPException
+
 from celery import shared_task
-from django.core.mail import send_mail
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
 
-from config import settings
+from config.db_router import replica_reads
+from materials.counters import repair_counters
 from materials.models import Course
-from users.models import Subscription
+from users.maintenance import run_batched
+from users.models import PendingCourseUpdate, Subscription
+
+
+def _chunks(iterable, size):
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
 
 
 @shared_task
+@replica_reads
 def send_course_update_notification(course_id):
-    course = Course.objects.get(id=course_id)
-    subscribers = Subscription.objects.filter(course=course)
-    for subscriber in subscribers:
-        subject = f'Обновление курса {course.name}'
-        message = f'Курс "{course.name}" был обновлен. Проверьте новые материалы!'
-        recipient_list = [subscriber.user.email]
-
-        send_mail(
-            subject=subject,
-            message=message,
-            from_email=settings.EMAIL_HOST_USER,
-            recipient_list=recipient_list,
-            fail_silently=False,
+    """
+    Рассылает уведомление об обновлении курса.
+    Адреса подписчиков читаются потоково, без загрузки объектов пользователей,
+    и отправляются пачками по NOTIFICATION_CHUNK_SIZE отдельными подзадачами.
+    Подписчикам в режиме сводки обновление откладывается до send_course_update_digests.
+    Подписки читаются с реплики, если она настроена.
+    """
+    course_name = (
+        Course.objects.filter(id=course_id).values_list("name", flat=True).first()
+    )
+    if course_name is None:
+        return "Курс удален"
+    subscriptions = Subscription.objects.filter(course_id=course_id).order_by("pk")
+
+    digest_user_ids = (
+        subscriptions.filter(user__notification_mode="digest")
+        .values_list("user_id", flat=True)
+        .iterator(chunk_size=settings.NOTIFICATION_CHUNK_SIZE)
+    )
+    for chunk in _chunks(digest_user_ids, settings.NOTIFICATION_CHUNK_SIZE):
+        PendingCourseUpdate.objects.bulk_create(
+            [
+                PendingCourseUpdate(user_id=user_id, course_id=course_id)
+                for user_id in chunk
+            ],
+            ignore_conflicts=True,
+        )
+
+    emails = (
+        subscriptions.filter(user__notification_mode="immediate")
+        .values_list("user__email", flat=True)
+        .iterator(chunk_size=settings.NOTIFICATION_CHUNK_SIZE)
+    )
+    chunks = 0
+    for chunk in _chunks(emails, settings.NOTIFICATION_CHUNK_SIZE):
+        send_course_update_chunk.delay(course_name, chunk)
+        chunks += 1
+    return f"Рассылка по курсу {course_name} разбита на {chunks} пачек"
+
+
+@shared_task
+def flush_course_update_notification(course_id):
+    """Отложенная рассылка по окну, запланированному schedule_course_update_notification."""
+    from materials.services import pop_course_update
+
+    if pop_course_update(course_id) is None:
+        return "Курс не изменялся"
+    return send_course_update_notification(course_id)
+
+
+@shared_task(bind=True, max_retries=5)
+def send_course_update_chunk(self, course_name, emails):
+    """
+    Отправляет пачку писем через одно SMTP-соединение.
+    При ошибке повторяет отправку только для еще не отправленных адресов.
+    """
+    subject = f"Обновление курса {course_name}"
+    message = f'Курс "{course_name}" был обновлен. Проверьте новые материалы!'
+    sent = 0
+    try:
+        with get_connection(fail_silently=False) as connection:
+            for email in emails:
+                sent += connection.send_messages(
+                    [EmailMessage(subject, message, settings.EMAIL_HOST_USER, [email])]
+                )
+                if self.request.id and sent % 100 == 0:
+                    self.update_state(
+                        state="PROGRESS", meta={"sent": sent, "total": len(emails)}
+                    )
+    except (SMTPException, OSError) as exc:
+        raise self.retry(
+            args=(course_name, emails[sent:]),
+            exc=exc,
+            countdown=2**self.request.retries * 10,
         )
+    return sent
+
+
+@shared_task
+def send_course_update_digests():
+    """
+    Отправляет каждому пользователю в режиме сводки одно письмо
+    со списком обновленных курсов. Накопленные обновления читаются
+    одним потоковым запросом, отправленные записи удаляются пачками.
+    """
+    pending = (
+        PendingCourseUpdate.objects.order_by("user_id", "course__name")
+        .values_list("id", "user_id", "user__email", "course__name")
+        .iterator(chunk_size=settings.NOTIFICATION_CHUNK_SIZE)
+    )
+    digests = (list(updates) for _, updates in groupby(pending, key=itemgetter(1)))
+    sent = 0
+    with get_connection(fail_silently=False) as connection:
+        for chunk in _chunks(digests, settings.NOTIFICATION_CHUNK_SIZE):
+            messages = [
+                EmailMessage(
+                    "Обновления курсов",
+                    "Обновлены курсы:\n"
+                    + "\n".join(f"- {update[3]}" for update in updates),
+                    settings.EMAIL_HOST_USER,
+                    [updates[0][2]],
+                )
+                for updates in chunk
+            ]
+            sent += connection.send_messages(messages)
+            PendingCourseUpdate.objects.filter(
+                id__in=[update[0] for updates in chunk for update in updates]
+            ).delete()
+    return f"Отправлено {sent} сводок"
+
+
+@shared_task
+def reconcile_course_counters():
+    """
+    Сверяет lessons_count и subscribers_count курсов с фактическими значениями
+    и исправляет расхождения, например после массовых операций в обход сигналов.
+    """
+    report = run_batched(
+        "reconcile_course_counters",
+        Course.objects.all(),
+        repair_counters,
+        batch_size=settings.MAINTENANCE_BATCH_SIZE,
+        pause=settings.MAINTENANCE_BATCH_PAUSE,
+    )
+    return f"Исправлены счетчики {report.rows} курсов"
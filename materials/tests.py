@@ -1,15 +1,48 @@
+import json
+import os
+import runpy
+import shutil
+import tempfile
+from unittest.mock import patch
+
+from asgiref.sync import async_to_sync
+from django.conf import settings
 from django.contrib.auth.models import Group
+from django.core import mail
+from django.core.cache import cache
+from django.db import connection, connections, transaction
+from django.http import HttpResponse, StreamingHttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from rest_framework import status
+from rest_framework.fields import DateTimeField
+from rest_framework.pagination import Cursor
 from rest_framework.reverse import reverse
 from rest_framework.test import APITestCase
 
+from materials.cache import get_stats
+from config import metrics
+from config.checks import check_shared_cache
+from config.celery import app as celery_app
+from config.db_router import use_replica
+from config.middleware import ReplicaRoutingMiddleware
 from materials.models import Course, Lesson
-from users.models import User, Subscription
+from materials.paginations import CourseKeysetPagination
+from materials.serializers import CourseSerializer
+from materials.services import schedule_course_update_notification
+from materials.tasks import (
+    flush_course_update_notification,
+    reconcile_course_counters,
+    send_course_update_digests,
+    send_course_update_notification,
+)
+from users.models import PendingCourseUpdate, User, Subscription
 
 
 class LessonTestCase(APITestCase):
 
     def setUp(self):
+        cache.clear()
         self.user = User.objects.create(email="testuser@mail.com")
         self.user.groups.clear()
         self.moderator_user = User.objects.create(email="moderator@mail.com")
@@ -75,12 +108,47 @@ class LessonTestCase(APITestCase):
                     "preview": None,
                     "course": self.course.pk,
                     "owner": self.user.pk,
+                    "last_update": DateTimeField().to_representation(
+                        self.lesson.last_update
+                    ),
                 },
             ],
         }
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(response.json(), result)
 
+    def test_lesson_retrieve_not_modified(self):
+        """Проверка ответа 304 на условный запрос урока"""
+        url = reverse("materials:lesson_detail", args=(self.lesson.pk,))
+        response = self.client.get(url)
+        etag = response["ETag"]
+        self.assertIn("Last-Modified", response)
+
+        response = self.client.get(url, headers={"If-None-Match": etag})
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response["ETag"], etag)
+
+        response = self.client.get(
+            url, headers={"If-Modified-Since": response["Last-Modified"]}
+        )
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        self.client.patch(
+            reverse("materials:lesson_update", args=(self.lesson.pk,)),
+            {"name": "Новое название"},
+        )
+        response = self.client.get(url, headers={"If-None-Match": etag})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response["ETag"], etag)
+
+    def test_lesson_change_updates_course(self):
+        """Проверка обновления last_update курса при изменении урока"""
+        previous_update = self.course.last_update
+        self.lesson.name = "Новое название"
+        self.lesson.save()
+        self.course.refresh_from_db()
+        self.assertGreater(self.course.last_update, previous_update)
+
     def test_lesson_create_by_moderator_denied(self):
         """Проверка запрета создания урока модератором"""
         self.client.force_authenticate(user=self.moderator_user)
@@ -100,3 +168,564 @@ class LessonTestCase(APITestCase):
         response = self.client.get(url)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(len(response.data["results"]), 1)
+
+
+class CourseTestCase(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(email="subscriber@mail.com")
+        self.courses = [
+            Course.objects.create(name=f"Курс {number}") for number in range(10)
+        ]
+        Subscription.objects.create(user=self.user, course=self.courses[0])
+        Subscription.objects.create(user=self.user, course=self.courses[3])
+        self.client.force_authenticate(user=self.user)
+
+    def test_course_list_is_subscribed(self):
+        """Проверка признака подписки в списке курсов"""
+        url = reverse("materials:course-list")
+        response = self.client.get(url, {"page_size": 10})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        subscribed = {
+            item["id"] for item in response.json()["results"] if item["is_subscribed"]
+        }
+        self.assertEqual(subscribed, {self.courses[0].pk, self.courses[3].pk})
+
+    @override_settings(ALLOWED_HOSTS=["internal.local", "example.com"])
+    def test_cached_file_urls_use_request_host(self):
+        """Проверка, что ссылки на файлы из кэша строятся по хосту текущего запроса"""
+        Course.objects.all().delete()
+        course = Course.objects.create(
+            name="Курс с картинкой", owner=self.user, preview="materials/previews/c.png"
+        )
+        Lesson.objects.create(
+            name="Урок", course=course, preview="materials/previews/l.png"
+        )
+        list_url = reverse("materials:course-list")
+        detail_url = reverse("materials:course-detail", args=(course.pk,))
+        for url in (list_url, detail_url):
+            self.client.get(url, HTTP_HOST="internal.local")
+
+        response = self.client.get(list_url, HTTP_HOST="example.com", secure=True)
+        preview = response.json()["results"][0]["preview"]
+        self.assertTrue(preview.startswith("https://example.com/"))
+
+        data = self.client.get(detail_url, HTTP_HOST="example.com", secure=True).json()
+        self.assertTrue(
+            data["lessons"][0]["preview"].startswith("https://example.com/")
+        )
+
+    def test_course_list_query_count(self):
+        """Проверка, что число запросов не зависит от размера страницы"""
+        url = reverse("materials:course-list")
+        for page_size in (1, 5, 10):
+            cache.clear()
+            with self.assertNumQueries(3):
+                response = self.client.get(url, {"page_size": page_size})
+            self.assertEqual(len(response.json()["results"]), page_size)
+
+    def test_course_list_cache(self):
+        """Проверка кэширования курсов без утечки подписок между пользователями"""
+        url = reverse("materials:course-list")
+        self.client.get(url, {"page_size": 10})
+        self.assertEqual(get_stats()["misses"], 10)
+
+        other_user = User.objects.create(email="other@mail.com")
+        self.client.force_authenticate(user=other_user)
+        response = self.client.get(url, {"page_size": 10})
+        self.assertEqual(get_stats()["hits"], 10)
+        self.assertFalse(
+            any(item["is_subscribed"] for item in response.json()["results"])
+        )
+
+        # Версии представлений меняются после фиксации транзакции
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            Subscription.objects.create(user=other_user, course=self.courses[5])
+            self.courses[0].name = "Переименованный курс"
+            self.courses[0].save()
+        self.assertTrue(callbacks)
+        response = self.client.get(url, {"page_size": 10})
+        results = {item["id"]: item for item in response.json()["results"]}
+        self.assertTrue(results[self.courses[5].pk]["is_subscribed"])
+        self.assertEqual(results[self.courses[0].pk]["name"], "Переименованный курс")
+
+    def test_course_retrieve_lessons(self):
+        """Проверка количества уроков и списка уроков в детальной информации о курсе"""
+        course = Course.objects.create(name="Курс с уроками", owner=self.user)
+        url = reverse("materials:course-detail", args=(course.pk,))
+        with CaptureQueriesContext(connection) as empty_course_queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()["lessons_count"], 0)
+
+        for number in range(3):
+            Lesson.objects.create(name=f"Урок {number}", course=course)
+        cache.clear()
+        with self.assertNumQueries(len(empty_course_queries)):
+            response = self.client.get(url)
+        data = response.json()
+        self.assertEqual(data["lessons_count"], 3)
+        self.assertEqual(len(data["lessons"]), 3)
+
+    def test_course_list_not_modified(self):
+        """Проверка ответа 304 на условный запрос списка курсов"""
+        url = reverse("materials:course-list")
+        response = self.client.get(url)
+        etag = response["ETag"]
+        self.assertNotIn("Last-Modified", response)
+
+        response = self.client.get(url, headers={"If-None-Match": etag})
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        Subscription.objects.create(user=self.user, course=self.courses[1])
+        response = self.client.get(url, headers={"If-None-Match": etag})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_course_retrieve_not_modified(self):
+        """Проверка, что изменение урока и подписки сбрасывает ETag курса"""
+        course = Course.objects.create(name="Курс с уроками", owner=self.user)
+        lesson = Lesson.objects.create(name="Урок", course=course)
+        url = reverse("materials:course-detail", args=(course.pk,))
+        etag = self.client.get(url)["ETag"]
+
+        response = self.client.get(url, headers={"If-None-Match": etag})
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertNotIn("Last-Modified", response)
+
+        # Счетчик подписчиков меняется без обновления last_update
+        Subscription.objects.create(user=self.user, course=course)
+        response = self.client.get(url, headers={"If-None-Match": etag})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        etag = response["ETag"]
+
+        with self.captureOnCommitCallbacks(execute=True):
+            lesson.delete()
+        response = self.client.get(url, headers={"If-None-Match": etag})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()["lessons_count"], 0)
+
+    def test_course_list_cursor_pagination(self):
+        """Проверка обхода списка курсов курсорной пагинацией"""
+        url = reverse("materials:course-list")
+        response = self.client.get(url, {"pagination": "cursor", "page_size": 4})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotIn("count", response.json())
+
+        seen = []
+        next_url = url + "?pagination=cursor&page_size=4"
+        while next_url:
+            data = self.client.get(next_url).json()
+            seen.extend(item["id"] for item in data["results"])
+            next_url = data["next"]
+        self.assertEqual(sorted(seen), sorted(course.pk for course in self.courses))
+        self.assertEqual(len(seen), len(set(seen)))
+
+        previous_data = self.client.get(data["previous"]).json()
+        self.assertEqual([item["id"] for item in previous_data["results"]], seen[-6:-2])
+
+    def test_course_list_tampered_cursor(self):
+        """Проверка ответа 404 на курсор с недопустимыми значениями ключа"""
+        url = reverse("materials:course-list")
+        paginator = CourseKeysetPagination()
+        paginator.base_url = f"http://testserver{url}?pagination=cursor"
+        cursor_url = paginator.encode_cursor(
+            Cursor(offset=0, reverse=False, position=json.dumps(["garbage", "x"]))
+        )
+        response = self.client.get(cursor_url)
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    @override_settings(TESTING=False)
+    def test_local_cache_rejected(self):
+        """Проверка, что вне тестов локальный кэш процесса не допускается"""
+        errors = check_shared_cache(None)
+        self.assertEqual([error.id for error in errors], ["config.E001"])
+
+
+class CourseNotificationTestCase(TestCase):
+
+    def setUp(self):
+        celery_app.conf.task_always_eager = True
+        self.addCleanup(setattr, celery_app.conf, "task_always_eager", False)
+        self.course = Course.objects.create(name="Курс с подписчиками")
+
+    def _subscribe(self, count):
+        users = User.objects.bulk_create(
+            User(email=f"user{number}@mail.com") for number in range(count)
+        )
+        Subscription.objects.bulk_create(
+            Subscription(user=user, course=self.course) for user in users
+        )
+
+    @override_settings(NOTIFICATION_CHUNK_SIZE=2)
+    def test_notification_sent_in_chunks(self):
+        """Проверка рассылки всем подписчикам пачками"""
+        self._subscribe(5)
+        result = send_course_update_notification(self.course.pk)
+        self.assertEqual(
+            result, "Рассылка по курсу Курс с подписчиками разбита на 3 пачек"
+        )
+        self.assertEqual(len(mail.outbox), 5)
+        self.assertEqual(
+            {message.to[0] for message in mail.outbox},
+            {f"user{number}@mail.com" for number in range(5)},
+        )
+
+    def test_notification_query_count(self):
+        """Проверка, что число запросов не зависит от числа подписчиков"""
+        self._subscribe(20)
+        with self.assertNumQueries(3):
+            send_course_update_notification(self.course.pk)
+        self.assertEqual(len(mail.outbox), 20)
+
+    def test_digest_mode(self):
+        """Проверка отложенной отправки обновлений одной сводкой"""
+        self._subscribe(3)
+        User.objects.filter(email="user0@mail.com").update(notification_mode="digest")
+        other_course = Course.objects.create(name="Второй курс")
+        digest_user = User.objects.get(email="user0@mail.com")
+        Subscription.objects.create(user=digest_user, course=other_course)
+
+        send_course_update_notification(self.course.pk)
+        send_course_update_notification(self.course.pk)
+        send_course_update_notification(other_course.pk)
+        self.assertEqual(len(mail.outbox), 4)
+        self.assertNotIn("user0@mail.com", {message.to[0] for message in mail.outbox})
+        self.assertEqual(PendingCourseUpdate.objects.count(), 2)
+
+        mail.outbox = []
+        send_course_update_digests()
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, ["user0@mail.com"])
+        self.assertIn("Второй курс", mail.outbox[0].body)
+        self.assertIn("Курс с подписчиками", mail.outbox[0].body)
+        self.assertFalse(PendingCourseUpdate.objects.exists())
+
+
+class CourseUpdateScheduleTestCase(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(email="editor@mail.com")
+        self.course = Course.objects.create(name="Курс", owner=self.user)
+        self.lesson = Lesson.objects.create(
+            name="Урок", course=self.course, owner=self.user
+        )
+        self.client.force_authenticate(user=self.user)
+
+    @patch("materials.services.flush_course_update_notification.apply_async")
+    def test_edits_schedule_one_notification(self, apply_async):
+        """Проверка одной рассылки на окно при нескольких изменениях"""
+        with self.captureOnCommitCallbacks(execute=True):
+            for _ in range(5):
+                schedule_course_update_notification(self.course.pk)
+        apply_async.assert_called_once()
+
+        with patch("materials.tasks.send_course_update_notification") as fan_out:
+            flush_course_update_notification(self.course.pk)
+            flush_course_update_notification(self.course.pk)
+        fan_out.assert_called_once_with(self.course.pk)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            schedule_course_update_notification(self.course.pk)
+        self.assertEqual(apply_async.call_count, 2)
+
+    @patch("materials.services.flush_course_update_notification.apply_async")
+    def test_rolled_back_edit_not_scheduled(self, apply_async):
+        """Проверка, что откат изменения не блокирует следующую рассылку"""
+        with self.captureOnCommitCallbacks(execute=True):
+            with transaction.atomic():
+                schedule_course_update_notification(self.course.pk)
+                transaction.set_rollback(True)
+        apply_async.assert_not_called()
+        self.course.refresh_from_db()
+        self.assertIsNone(self.course.update_pending_since)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            schedule_course_update_notification(self.course.pk)
+        apply_async.assert_called_once()
+
+    @patch("materials.services.flush_course_update_notification.apply_async")
+    def test_lesson_updates_coalesced(self, apply_async):
+        """Проверка объединения нескольких изменений урока в одну рассылку"""
+        url = reverse("materials:lesson_update", args=(self.lesson.pk,))
+        with self.captureOnCommitCallbacks(execute=True):
+            for number in range(5):
+                self.client.patch(url, {"name": f"Урок {number}"})
+        apply_async.assert_called_once_with(
+            (self.course.pk,), countdown=settings.COURSE_UPDATE_NOTIFICATION_WINDOW
+        )
+
+
+class CourseCountersTestCase(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(email="counter@mail.com")
+        self.first = Course.objects.create(name="Первый курс", owner=self.user)
+        self.second = Course.objects.create(name="Второй курс", owner=self.user)
+        self.client.force_authenticate(user=self.user)
+
+    def assertCounters(self, course, lessons, subscribers):
+        course.refresh_from_db()
+        self.assertEqual(
+            (course.lessons_count, course.subscribers_count), (lessons, subscribers)
+        )
+
+    def test_lessons_count(self):
+        """Проверка счетчика уроков при создании, переносе и удалении урока"""
+        lessons = [
+            Lesson.objects.create(name=f"Урок {number}", course=self.first)
+            for number in range(3)
+        ]
+        self.assertCounters(self.first, 3, 0)
+
+        lessons[0].course = self.second
+        lessons[0].save()
+        lessons[1].name = "Переименованный урок"
+        lessons[1].save()
+        self.assertCounters(self.first, 2, 0)
+        self.assertCounters(self.second, 1, 0)
+
+        lessons[2].delete()
+        self.assertCounters(self.first, 1, 0)
+
+    def test_subscribers_count(self):
+        """Проверка счетчика подписчиков при подписке, отписке и удалении пользователя"""
+        other = User.objects.create(email="other@mail.com")
+        url = reverse("users:subscriptions")
+        self.client.post(url, {"course_id": self.first.pk})
+        Subscription.objects.create(user=other, course=self.first)
+        self.assertCounters(self.first, 0, 2)
+
+        response = self.client.get(
+            reverse("materials:course-detail", args=(self.first.pk,))
+        )
+        self.assertEqual(response.json()["subscribers_count"], 2)
+
+        self.client.post(url, {"course_id": self.first.pk})
+        self.assertCounters(self.first, 0, 1)
+        other.delete()
+        self.assertCounters(self.first, 0, 0)
+        self.assertEqual(Subscription.objects.filter(course=self.first).count(), 1)
+
+    def test_reconcile_repairs_drift(self):
+        """Проверка исправления счетчиков, измененных в обход сигналов"""
+        Lesson.objects.bulk_create(
+            Lesson(name=f"Урок {number}", course=self.second) for number in range(4)
+        )
+        Course.objects.filter(pk=self.first.pk).update(subscribers_count=7)
+
+        self.assertIn("2 курсов", reconcile_course_counters())
+        self.assertCounters(self.first, 0, 0)
+        self.assertCounters(self.second, 4, 0)
+
+    def test_order_by_popularity(self):
+        """Проверка сортировки курсов по числу подписчиков"""
+        third = Course.objects.create(name="Третий курс", owner=self.user)
+        for number in range(2):
+            Subscription.objects.create(
+                user=User.objects.create(email=f"fan{number}@mail.com"), course=third
+            )
+        Subscription.objects.create(user=self.user, course=self.second)
+
+        response = self.client.get(
+            reverse("materials:course-list"), {"ordering": "-subscribers_count"}
+        )
+        self.assertEqual(
+            [item["id"] for item in response.json()["results"]],
+            [third.pk, self.second.pk, self.first.pk],
+        )
+
+
+class MetricsTestCase(APITestCase):
+    def setUp(self):
+        metrics.reset()
+        self.addCleanup(metrics.reset)
+        self.user = User.objects.create(email="metrics@mail.com")
+        self.admin = User.objects.create(email="admin@mail.com", is_staff=True)
+        self.client.force_authenticate(user=self.user)
+
+    def get_metrics(self):
+        self.client.force_authenticate(user=self.admin)
+        response = self.client.get(reverse("metrics"))
+        self.client.force_authenticate(user=self.user)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response["Content-Type"].startswith("text/plain"))
+        return response.content.decode()
+
+    def test_metrics_by_view_name(self):
+        """Проверка времени ответа и числа SQL-запросов по имени URL"""
+        for url_name in ("materials:lessons_list", "materials:course-list"):
+            # Журнал запросов очищается в начале каждого запроса, поэтому
+            # запросы считаются для каждого ответа отдельно
+            total_queries = 0
+            for _ in range(2):
+                with CaptureQueriesContext(connection) as queries:
+                    self.client.get(reverse(url_name))
+                total_queries += len(queries)
+            labels = f'view="{url_name}",method="GET"'
+            text = self.get_metrics()
+            self.assertIn(f"http_request_duration_seconds_count{{{labels}}} 2", text)
+            self.assertIn(f"http_request_queries_sum{{{labels}}} {total_queries}", text)
+            self.assertIn(f"http_request_sql_seconds_total{{{labels}}}", text)
+
+    def test_metrics_admin_only(self):
+        """Проверка доступа к метрикам только для администраторов"""
+        response = self.client.get(reverse("metrics"))
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_metrics_from_other_processes(self):
+        """Проверка суммирования метрик других процессов из METRICS_DIR"""
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        values = [0] * metrics.SERIES_SIZE
+        values[metrics.COUNT] = 3
+        with open(os.path.join(directory, "1.json"), "w") as file:
+            json.dump([["materials:lessons_list", "GET", values]], file)
+
+        # Файл завершившегося процесса с тем же pid не перезаписывается
+        with open(os.path.join(directory, f"{os.getpid()}-1.json"), "w") as file:
+            json.dump([["materials:lessons_list", "GET", values]], file)
+
+        with override_settings(METRICS_DIR=directory, METRICS_FLUSH_INTERVAL=0):
+            self.client.get(reverse("materials:lessons_list"))
+            own_files = [
+                name
+                for name in os.listdir(directory)
+                if name.startswith(f"{os.getpid()}-")
+                and name != f"{os.getpid()}-1.json"
+            ]
+            self.assertEqual(len(own_files), 1)
+            text = self.get_metrics()
+        self.assertIn(
+            'http_request_duration_seconds_count{view="materials:lessons_list",'
+            'method="GET"} 7',
+            text,
+        )
+
+    def test_metrics_dir_errors_do_not_fail_requests(self):
+        """Проверка, что недоступный METRICS_DIR не ломает запросы и /metrics/"""
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        missing = os.path.join(directory, "metrics")
+        with override_settings(METRICS_DIR=missing, METRICS_FLUSH_INTERVAL=0):
+            response = self.client.get(reverse("materials:lessons_list"))
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertTrue(os.listdir(missing))
+
+        # Вместо каталога - файл: ни записать, ни прочитать
+        unusable = os.path.join(directory, "file")
+        open(unusable, "w").close()
+        with override_settings(METRICS_DIR=unusable, METRICS_FLUSH_INTERVAL=0):
+            with self.assertLogs("config.metrics", level="WARNING"):
+                response = self.client.get(reverse("materials:lessons_list"))
+                self.assertEqual(response.status_code, status.HTTP_200_OK)
+                self.assertIn("http_request_duration_seconds", self.get_metrics())
+
+    def test_metrics_dir_cleared_on_start(self):
+        """Проверка очистки METRICS_DIR при старте мастера gunicorn"""
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        for name in ("1-1.json", "2-1.json.tmp", "keep.txt"):
+            open(os.path.join(directory, name), "w").close()
+
+        config = runpy.run_path(os.path.join(settings.BASE_DIR, "gunicorn.conf.py"))
+        with patch.dict(os.environ, {"METRICS_DIR": directory}):
+            config["on_starting"](None)
+        self.assertEqual(os.listdir(directory), ["keep.txt"])
+
+
+@override_settings(DATABASE_REPLICAS=["replica"], REPLICA_PIN_SECONDS=30)
+class ReplicaRoutingTestCase(TestCase):
+    """Миграции на реплику не применяются, нужные таблицы создаются вручную."""
+
+    databases = {"default", "replica"}
+
+    @classmethod
+    def setUpClass(cls):
+        with connections["replica"].schema_editor() as editor:
+            editor.create_model(User)
+            editor.create_model(Course)
+        super().setUpClass()
+
+    @classmethod
+    def setUpTestData(cls):
+        Course.objects.using("replica").create(name="Курс на реплике")
+
+    def setUp(self):
+        Course.objects.create(name="Курс в основной базе")
+        self.middleware = ReplicaRoutingMiddleware(self._view)
+        self.factory = RequestFactory()
+
+    @staticmethod
+    def _view(request):
+        return HttpResponse(",".join(Course.objects.values_list("name", flat=True)))
+
+    def test_safe_requests_read_from_replica(self):
+        """Проверка чтения с реплики в безопасном запросе"""
+        response = self.middleware(self.factory.get("/"))
+        self.assertEqual(response.content.decode(), "Курс на реплике")
+        self.assertNotIn(settings.REPLICA_PIN_COOKIE, response.cookies)
+
+    def test_reads_stick_to_primary_after_write(self):
+        """Проверка чтения из основной базы после изменяющего запроса"""
+        response = self.middleware(self.factory.post("/"))
+        self.assertEqual(response.content.decode(), "Курс в основной базе")
+        cookie = response.cookies[settings.REPLICA_PIN_COOKIE]
+        self.assertEqual(cookie["max-age"], 30)
+
+        request = self.factory.get("/")
+        request.COOKIES[settings.REPLICA_PIN_COOKIE] = cookie.value
+        response = self.middleware(request)
+        self.assertEqual(response.content.decode(), "Курс в основной базе")
+
+    def test_streaming_body_reads_from_replica(self):
+        """Проверка чтения с реплики при передаче тела потокового ответа"""
+
+        def names():
+            yield from Course.objects.values_list("name", flat=True)
+
+        def view(request):
+            return StreamingHttpResponse(names())
+
+        response = ReplicaRoutingMiddleware(view)(self.factory.get("/"))
+        self.assertEqual(
+            b"".join(response.streaming_content).decode(), "Курс на реплике"
+        )
+
+    def test_async_streaming_body_reads_from_replica(self):
+        """Проверка маршрутизации в асинхронной цепочке middleware"""
+
+        async def names():
+            async for name in Course.objects.values_list("name", flat=True):
+                yield name
+
+        async def view(request):
+            return StreamingHttpResponse(names())
+
+        async def read(request):
+            response = await ReplicaRoutingMiddleware(view)(request)
+            return b"".join([part async for part in response.streaming_content])
+
+        self.assertEqual(
+            async_to_sync(read)(self.factory.get("/")).decode(), "Курс на реплике"
+        )
+
+    def test_cache_filled_from_primary(self):
+        """Проверка, что кэш представлений не заполняется данными реплики"""
+        cache.clear()
+        Course.objects.create(pk=1000, name="Новое название")
+        Course.objects.using("replica").create(pk=1000, name="Старое название")
+        context = {"subscribed_course_ids": set()}
+        for _ in range(2):
+            with use_replica():
+                courses = list(Course.objects.filter(pk=1000))
+                data = CourseSerializer(courses, many=True, context=context).data
+            self.assertEqual(data[0]["name"], "Новое название")
+
+    def test_writes_go_to_primary(self):
+        """Проверка записи в основную базу при чтении с реплики"""
+        with use_replica():
+            Course.objects.create(name="Новый курс")
+            self.assertEqual(Course.objects.count(), 1)
+        self.assertEqual(Course.objects.count(), 2)
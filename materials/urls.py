@@ -3,6 +3,7 @@ from rest_framework.routers import SimpleRouter
 
 from materials.apps import MaterialsConfig
 from materials.views import (
+    CacheStatsApiView,
     CourseViewSet,
     LessonCreateApiView,
     LessonDestroyApiView,
@@ -29,4 +30,5 @@ urlpatterns = [
         LessonDestroyApiView.as_view(),
         name="lesson_destroy",
     ),
+    path("cache/stats/", CacheStatsApiView.as_view(), name="cache_stats"),
 ] + router.urls
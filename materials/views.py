@@ -1,9 +1,9 @@
-from datetime import timedelta
-
 from django.shortcuts import render
-from django.utils import timezone
 from django.utils.decorators import method_decorator
+from django.utils.functional import SimpleLazyObject, cached_property
+from django_filters.rest_framework import DjangoFilterBackend
 from drf_yasg.utils import swagger_auto_schema
+from rest_framework.filters import OrderingFilter
 from rest_framework.generics import (
     CreateAPIView,
     DestroyAPIView,
@@ -11,25 +11,36 @@ from rest_framework.generics import (
     RetrieveAPIView,
     UpdateAPIView,
 )
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.views import APIView
 from rest_framework.viewsets import ModelViewSet
 
+from materials.cache import get_stats, get_subscribed_course_ids
+from materials.mixins import ConditionalGetMixin
 from materials.models import Course, Lesson
-from materials.paginations import CustomPagination
+from materials.paginations import (
+    CourseKeysetPagination,
+    CustomPagination,
+    LessonKeysetPagination,
+    PaginationModeMixin,
+)
 from materials.serializers import (
     CourseDetailSerializer,
     CourseSerializer,
     LessonSerializer,
 )
 from users.permissions import IsModerator, IsOwner
-from materials.tasks import send_course_update_notification
+from users.roles import is_moderator
+from materials.services import schedule_course_update_notification
 
 
 @method_decorator(
     name="list",
     decorator=swagger_auto_schema(
         operation_description="Получение списка курсов. "
-        "Модераторы видят все курсы, обычные пользователи - только свои."
+        "Модераторы видят все курсы, обычные пользователи - только свои. "
+        "Сортировка по популярности: ?ordering=-subscribers_count."
     ),
 )
 @method_decorator(
@@ -67,17 +78,52 @@ from materials.tasks import send_course_update_notification
         "являющимся владельцами курса или не являющимся модераторами."
     ),
 )
-class CourseViewSet(ModelViewSet):
+class CourseViewSet(ConditionalGetMixin, PaginationModeMixin, ModelViewSet):
     """ViewSet для работы с курсами. Предоставляет полный CRUD функционал."""
 
     queryset = Course.objects.all()
     pagination_class = CustomPagination
+    cursor_pagination_class = CourseKeysetPagination
+
+    filter_backends = [DjangoFilterBackend, OrderingFilter]
+    ordering_fields = ["subscribers_count", "lessons_count"]
+    etag_fields = ("lessons_count", "subscribers_count")
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        ordering = queryset.query.order_by
+        if ordering:
+            # id в конце делает порядок однозначным при равных счетчиках
+            # и совпадает с индексом course_popularity_idx
+            queryset = queryset.order_by(
+                *ordering, "-id" if ordering[0].startswith("-") else "id"
+            )
+        return queryset
+
+    def get_etag_parts(self, obj):
+        if self.action == "list":
+            return super().get_etag_parts(obj) + (obj.pk in self.subscribed_course_ids,)
+        return super().get_etag_parts(obj)
+
+    @cached_property
+    def subscribed_course_ids(self):
+        return get_subscribed_course_ids(self.request.user)
 
     def get_serializer_class(self):
         if self.action == "retrieve":
             return CourseDetailSerializer
         return CourseSerializer
 
+    def get_serializer_context(self):
+        # Подписки пользователя загружаются одним запросом на весь ответ,
+        # а не отдельным запросом для каждого курса
+        context = super().get_serializer_context()
+        if self.request.user.is_authenticated:
+            context["subscribed_course_ids"] = SimpleLazyObject(
+                lambda: self.subscribed_course_ids
+            )
+        return context
+
     def perform_create(self, serializer):
         course = serializer.save(owner=self.request.user)
         course.save()
@@ -93,9 +139,7 @@ class CourseViewSet(ModelViewSet):
 
     def perform_update(self, serializer):
         instance = serializer.save()
-        time_threshold = timezone.now() - timedelta(hours=4)
-        if instance.last_update < time_threshold:
-            send_course_update_notification.delay(instance.id)
+        schedule_course_update_notification(instance.id)
 
 
 @method_decorator(
@@ -123,16 +167,17 @@ class LessonCreateApiView(CreateAPIView):
         operation_description="Получение списка уроков. Модераторы видят все уроки, обычные пользователи - только свои."
     ),
 )
-class LessonListApiView(ListAPIView):
+class LessonListApiView(PaginationModeMixin, ListAPIView):
     """API для получения списка уроков."""
 
     serializer_class = LessonSerializer
     pagination_class = CustomPagination
+    cursor_pagination_class = LessonKeysetPagination
 
     def get_queryset(self):
-        if self.request.user.groups.filter(name="moderators").exists():
+        if is_moderator(self.request):
             return Lesson.objects.all()
-        return Lesson.objects.filter(owner=self.request.user)
+        return Lesson.objects.filter(owner_id=self.request.user.pk)
 
 
 @method_decorator(
@@ -143,7 +188,7 @@ class LessonListApiView(ListAPIView):
         "являющимся модераторами или владельцами урока."
     ),
 )
-class LessonRetrieveApiView(RetrieveAPIView):
+class LessonRetrieveApiView(ConditionalGetMixin, RetrieveAPIView):
     """API для просмотра урока."""
 
     queryset = Lesson.objects.all()
@@ -174,12 +219,7 @@ class LessonUpdateApiView(UpdateAPIView):
 
     def perform_update(self, serializer):
         instance = serializer.save()
-        course = instance.course
-        time_threshold = timezone.now() - timedelta(hours=4)
-        if course.last_update < time_threshold:
-            course.last_update = timezone.now()
-            course.save()
-            send_course_update_notification.delay(course.id)
+        schedule_course_update_notification(instance.course_id)
 
 @method_decorator(
     name="delete",
@@ -194,3 +234,19 @@ class LessonDestroyApiView(DestroyAPIView):
     queryset = Lesson.objects.all()
     serializer_class = LessonSerializer
     permission_classes = [IsAuthenticated & (IsOwner | ~IsModerator)]
+
+
+@method_decorator(
+    name="get",
+    decorator=swagger_auto_schema(
+        operation_description="Счетчики попаданий и промахов кэша курсов и уроков. "
+        "Доступно только администраторам."
+    ),
+)
+class CacheStatsApiView(APIView):
+    """API для просмотра статистики кэша."""
+
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return Response(get_stats())
@@ -0,0 +1,70 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.translation import gettext_lazy as _
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.models import TokenUser
+from rest_framework_simplejwt.settings import api_settings
+
+from config.db_router import use_replica
+from users.roles import ROLES_CLAIM
+
+
+def _user_key(user_id):
+    return f"users:user:{user_id}"
+
+
+def invalidate_cached_user(user_id):
+    # Запись удаляется после фиксации, чтобы ее не восстановили из старой строки
+    transaction.on_commit(lambda: cache.delete(_user_key(user_id)))
+
+
+class ClaimsTokenUser(TokenUser):
+    """Пользователь, восстановленный из утверждений токена без обращения к БД."""
+
+    @property
+    def roles(self):
+        return frozenset(self.token[ROLES_CLAIM])
+
+
+class StatelessJWTAuthentication(JWTAuthentication):
+    """
+    JWT-аутентификация без запроса к таблице пользователей на чтении.
+    Для безопасных методов пользователь строится из утверждений токена
+    (id, is_staff, роли). Для изменяющих запросов загружается полный User
+    через короткоживущий кэш (USER_CACHE_TIMEOUT).
+    При JWT_STATELESS_AUTH = False работает как обычный JWTAuthentication.
+    """
+
+    def authenticate(self, request):
+        if not settings.JWT_STATELESS_AUTH:
+            return super().authenticate(request)
+
+        header = self.get_header(request)
+        if header is None:
+            return None
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+        validated_token = self.get_validated_token(raw_token)
+
+        if request.method in SAFE_METHODS and ROLES_CLAIM in validated_token:
+            return ClaimsTokenUser(validated_token), validated_token
+        return self.get_cached_user(validated_token), validated_token
+
+    def get_cached_user(self, validated_token):
+        user_id = validated_token.get(api_settings.USER_ID_CLAIM)
+        if user_id is None:
+            return self.get_user(validated_token)
+
+        key = _user_key(user_id)
+        user = cache.get(key)
+        if user is None:
+            with use_replica(False):
+                user = self.get_user(validated_token)
+            cache.set(key, user, settings.USER_CACHE_TIMEOUT)
+        elif api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+        return user
@@ -0,0 +1,35 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.shortcuts import get_object_or_404
+
+from config.db_router import use_replica
+from users.models import User
+from users.serializers import UserPublicSerializer
+
+
+def _public_profile_key(user_id):
+    return f"users:public_profile:{user_id}"
+
+
+def get_public_profile(user_id):
+    """
+    Публичное представление пользователя (UserPublicSerializer) из кэша.
+    Представление строится без request, поэтому ссылка на аватар
+    хранится относительной и не зависит от хоста запроса.
+    """
+    key = _public_profile_key(user_id)
+    data = cache.get(key)
+    if data is None:
+        # Кэш заполняется только из основной базы: данные отстающей реплики
+        # остались бы в нем после сброса invalidate_public_profile
+        with use_replica(False):
+            user = get_object_or_404(User, pk=user_id)
+        data = dict(UserPublicSerializer(user).data)
+        cache.set(key, data, settings.USER_PROFILE_CACHE_TIMEOUT)
+    return data
+
+
+def invalidate_public_profile(user_id):
+    # После фиксации, иначе кэш могли бы заново заполнить прежними данными
+    transaction.on_commit(lambda: cache.delete(_public_profile_key(user_id)))
@@ -0,0 +1,12 @@
+from django_filters import rest_framework as filters
+
+from users.models import PaymentSummary
+
+
+class PaymentSummaryFilter(filters.FilterSet):
+    date_from = filters.DateFilter(field_name="day", lookup_expr="gte")
+    date_to = filters.DateFilter(field_name="day", lookup_expr="lte")
+
+    class Meta:
+        model = PaymentSummary
+        fields = ["course_id", "lesson_id", "payment_method", "payment_status"]
@@ -0,0 +1,64 @@
+import logging
+import time
+from dataclasses import dataclass
+
+from django.db import transaction
+from django.db.models import Max, Min
+
+from users.models import MaintenanceCheckpoint
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class BatchReport:
+    rows: int
+    batches: int
+    seconds: float
+
+    @property
+    def rows_per_second(self):
+        return self.rows / self.seconds if self.seconds else 0.0
+
+
+def run_batched(name, queryset, action, batch_size=1000, pause=0.1):
+    """
+    Применяет action к queryset диапазонами первичного ключа по batch_size.
+    Каждый диапазон обрабатывается в отдельной транзакции вместе с сохранением
+    контрольной точки, поэтому блокировки держатся недолго, а после сбоя
+    повторный запуск продолжает с последнего завершенного диапазона.
+    action получает queryset диапазона и возвращает число обработанных строк.
+    """
+    checkpoint, _ = MaintenanceCheckpoint.objects.get_or_create(name=name)
+    bounds = queryset.filter(pk__gt=checkpoint.last_pk).aggregate(
+        first=Min("pk"), last=Max("pk")
+    )
+    report = BatchReport(rows=0, batches=0, seconds=0.0)
+    if bounds["first"] is None:
+        checkpoint.delete()
+        return report
+
+    started = time.monotonic()
+    start = bounds["first"] - 1
+    while start < bounds["last"]:
+        end = start + batch_size
+        with transaction.atomic():
+            report.rows += action(queryset.filter(pk__gt=start, pk__lte=end))
+            checkpoint.last_pk = end
+            checkpoint.save(update_fields=["last_pk", "updated_at"])
+        report.batches += 1
+        start = end
+        if start < bounds["last"] and pause:
+            time.sleep(pause)
+    report.seconds = time.monotonic() - started
+
+    # Проход завершен, следующий запуск начнет таблицу сначала
+    checkpoint.delete()
+    logger.info(
+        "%s: %s строк за %s пачек, %.0f строк/с",
+        name,
+        report.rows,
+        report.batches,
+        report.rows_per_second,
+    )
+    return report
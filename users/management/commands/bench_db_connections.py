@@ -0,0 +1,94 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management import BaseCommand
+from django.db import connections
+from django.test import RequestFactory
+from django.urls import reverse
+from rest_framework_simplejwt.tokens import AccessToken
+
+from users.models import User
+
+BENCH_EMAIL = "bench_db@example.com"
+
+
+class Command(BaseCommand):
+    """
+    Сравнение числа запросов в секунду к списку уроков при открытии соединения
+    на каждый запрос (CONN_MAX_AGE=0), с постоянными соединениями и с пулом
+    psycopg 3. Запросы проходят через WSGI-обработчик, поэтому соединения
+    закрываются и возвращаются так же, как на сервере.
+    Пользователь для запросов сохраняется в базе и удаляется после замеров.
+    Пример использования:
+        python manage.py bench_db_connections --requests 5000 --threads 8
+    """
+
+    help = "Замер запросов в секунду с пулом соединений и без него"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=2000)
+        parser.add_argument("--threads", type=int, default=4)
+
+    def handle(self, *args, **options):
+        db_settings = connections.settings["default"]
+        modes = [
+            ("Без сохранения", {"CONN_MAX_AGE": 0, "OPTIONS": {}}),
+            ("Постоянные", {"CONN_MAX_AGE": 60, "OPTIONS": {}}),
+        ]
+        if self._pool_available(db_settings):
+            pool = {"min_size": options["threads"], "max_size": options["threads"]}
+            modes.append(("Пул", {"CONN_MAX_AGE": 0, "OPTIONS": {"pool": pool}}))
+        else:
+            self.stdout.write("Пул пропущен: нужны PostgreSQL и psycopg[pool]")
+
+        original = {key: db_settings.get(key) for key in ("CONN_MAX_AGE", "OPTIONS")}
+        connections.close_all()
+        user = User.objects.create(email=BENCH_EMAIL)
+        token = str(AccessToken.for_user(user))
+        try:
+            for name, overrides in modes:
+                # Соединения каждого потока создаются из этого словаря настроек
+                db_settings.update(overrides)
+                rate = self._measure(token, options["requests"], options["threads"])
+                self.stdout.write(f"{name:<15} {rate:10.0f} запросов/с")
+                if overrides["OPTIONS"]:
+                    connections["default"].close_pool()
+        finally:
+            db_settings.update(original)
+            connections.close_all()
+            User.objects.filter(email=BENCH_EMAIL).delete()
+
+    @staticmethod
+    def _pool_available(db_settings):
+        if db_settings["ENGINE"] != "django.db.backends.postgresql":
+            return False
+        try:
+            import psycopg_pool  # noqa: F401
+        except ImportError:
+            return False
+        return True
+
+    @staticmethod
+    def _measure(token, requests, threads):
+        handler = WSGIHandler()
+        environ = (
+            RequestFactory()
+            .get(
+                reverse("materials:lessons_list"),
+                SERVER_NAME="localhost",
+                HTTP_AUTHORIZATION=f"Bearer {token}",
+            )
+            .environ
+        )
+
+        def worker(count):
+            for _ in range(count):
+                response = handler(dict(environ), lambda status, headers: None)
+                response.close()
+            connections.close_all()
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(threads) as executor:
+            list(executor.map(worker, [requests // threads] * threads))
+        return requests // threads * threads / (time.perf_counter() - started)
@@ -0,0 +1,63 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management import BaseCommand
+
+# Выполняется в отдельном процессе, чтобы каждый замер начинался с холодного импорта
+STARTUP_SCRIPT = """
+import json, socket, time
+connections = []
+_connect = socket.socket.connect
+def connect(sock, address):
+    connections.append(str(address))
+    return _connect(sock, address)
+socket.socket.connect = connect
+
+started = time.perf_counter()
+import django
+django.setup()
+setup = time.perf_counter() - started
+
+from django.urls import get_resolver
+get_resolver().url_patterns
+urls = time.perf_counter() - started - setup
+print(json.dumps({"setup": setup, "urls": urls, "connections": connections}))
+"""
+
+
+class Command(BaseCommand):
+    """
+    Замер времени запуска процесса: django.setup() и загрузка URL-конфигурации,
+    которая импортирует все представления и сервисы. Также выводит число
+    сетевых соединений, открытых во время запуска.
+    Пример использования:
+        python manage.py bench_startup --repeat 10
+    """
+
+    help = "Замер времени django.setup() и загрузки URL"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--repeat", type=int, default=5)
+
+    def handle(self, *args, **options):
+        env = {**os.environ, "DJANGO_SETTINGS_MODULE": settings.SETTINGS_MODULE}
+        runs = []
+        for _ in range(options["repeat"]):
+            output = subprocess.run(
+                [sys.executable, "-c", STARTUP_SCRIPT],
+                env=env,
+                capture_output=True,
+                text=True,
+                check=True,
+            ).stdout
+            runs.append(json.loads(output.splitlines()[-1]))
+
+        setup = statistics.median(run["setup"] for run in runs) * 1000
+        urls = statistics.median(run["urls"] for run in runs) * 1000
+        self.stdout.write(f"django.setup():  {setup:.1f} мс")
+        self.stdout.write(f"Загрузка URL:    {urls:.1f} мс")
+        self.stdout.write(f"Соединений:      {len(runs[-1]['connections'])}")
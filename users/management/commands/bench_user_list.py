@@ -0,0 +1,73 @@
+import time
+import tracemalloc
+
+from django.core.management import BaseCommand
+from django.db import transaction
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from users.models import User
+from users.serializers import UserPublicSerializer
+from users.views import UserListAPIView
+
+
+class Command(BaseCommand):
+    """
+    Сравнение пикового потребления памяти при выгрузке списка пользователей
+    одним JSON-массивом (прежнее поведение) и потоком ?stream=ndjson.
+    Данные создаются во временной транзакции и откатываются после замеров.
+    Пример использования:
+        python manage.py bench_user_list --users 200000
+    """
+
+    help = "Замер памяти при выгрузке списка пользователей"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=100_000)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            admin = self._seed(options["users"])
+            full = self._measure(self._render_all)
+            stream = self._measure(self._stream, admin)
+            transaction.set_rollback(True)
+
+        for name, (peak, seconds, size) in (("Весь список", full), ("Поток", stream)):
+            self.stdout.write(
+                f"{name:<12} пик памяти {peak / 2**20:8.1f} МБ, "
+                f"{seconds:6.2f} с, {size / 2**20:.1f} МБ ответа"
+            )
+
+    @staticmethod
+    def _seed(count, batch_size=10_000):
+        for start in range(0, count, batch_size):
+            User.objects.bulk_create(
+                User(email=f"bench{number}@example.com", city="Москва")
+                for number in range(start, min(start + batch_size, count))
+            )
+        return User.objects.create(email="bench_admin@example.com", is_staff=True)
+
+    @staticmethod
+    def _render_all():
+        """Прежняя реализация: все пользователи одним массивом."""
+        data = UserPublicSerializer(User.objects.all(), many=True).data
+        return len(JSONRenderer().render(data))
+
+    @staticmethod
+    def _stream(admin):
+        request = APIRequestFactory().get(
+            "/users/list/?stream=ndjson", SERVER_NAME="localhost"
+        )
+        force_authenticate(request, user=admin)
+        response = UserListAPIView.as_view()(request)
+        return sum(len(line) for line in response.streaming_content)
+
+    @staticmethod
+    def _measure(func, *args):
+        tracemalloc.start()
+        started = time.perf_counter()
+        size = func(*args)
+        seconds = time.perf_counter() - started
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        return peak, seconds, size
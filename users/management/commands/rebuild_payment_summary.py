@@ -0,0 +1,19 @@
+from django.core.management import BaseCommand
+
+from users.revenue import rebuild_summary
+
+
+class Command(BaseCommand):
+    """
+    Пересчет сводки платежей по всей таблице платежей.
+    Нужен для первоначального заполнения и после массовых изменений
+    платежей в обход сигналов (bulk_create, update).
+    Пример использования:
+        python manage.py rebuild_payment_summary
+    """
+
+    help = "Пересчет сводки платежей"
+
+    def handle(self, *args, **options):
+        rows = rebuild_summary()
+        self.stdout.write(f"Строк сводки: {rows}")
@@ -0,0 +1,39 @@
+import json
+import time
+from itertools import islice
+
+from django.conf import settings
+from django.core.management import BaseCommand
+
+from users.models import StripeEvent
+from users.services import store_stripe_events
+from users.tasks import apply_stripe_events
+
+
+class Command(BaseCommand):
+    """
+    Повторная загрузка событий Stripe из файла (одно JSON-событие на строку)
+    во входящую таблицу и их применение к платежам.
+    Уже полученные события пропускаются по event_id.
+    Пример использования:
+        python manage.py replay_stripe_events events.jsonl
+    """
+
+    help = "Загрузка и применение событий Stripe из файла"
+
+    def add_arguments(self, parser):
+        parser.add_argument("path")
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        before = StripeEvent.objects.count()
+        with open(options["path"], encoding="utf-8") as lines:
+            events = (json.loads(line) for line in lines if line.strip())
+            while batch := list(islice(events, settings.STRIPE_EVENTS_BATCH_SIZE)):
+                store_stripe_events(batch)
+        stored = StripeEvent.objects.count() - before
+
+        result = apply_stripe_events()
+        self.stdout.write(f"Новых событий: {stored}")
+        self.stdout.write(result)
+        self.stdout.write(f"Время: {time.perf_counter() - started:.2f} с")
@@ -0,0 +1,20 @@
+# Generated by Django 5.2.1 on 2026-10-17 11:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("materials", "0005_course_course_last_update_id_idx"),
+        ("users", "0004_payments_payment_status_payments_stripe_payment_link_and_more"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="payments",
+            index=models.Index(
+                fields=["payment_date", "id"], name="payment_date_id_idx"
+            ),
+        ),
+    ]
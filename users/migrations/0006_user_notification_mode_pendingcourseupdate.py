@@ -0,0 +1,69 @@
+# Generated by Django 5.2.1 on 2026-10-17 11:49
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("materials", "0006_lesson_last_update"),
+        ("users", "0005_payments_payment_date_id_idx"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="user",
+            name="notification_mode",
+            field=models.CharField(
+                choices=[("immediate", "Сразу"), ("digest", "Ежедневная сводка")],
+                default="immediate",
+                max_length=10,
+                verbose_name="Уведомления об обновлениях курсов",
+            ),
+        ),
+        migrations.CreateModel(
+            name="PendingCourseUpdate",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "created_at",
+                    models.DateTimeField(
+                        auto_now_add=True, verbose_name="Дата изменения"
+                    ),
+                ),
+                (
+                    "course",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="pending_updates",
+                        to="materials.course",
+                        verbose_name="Курс",
+                    ),
+                ),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="pending_course_updates",
+                        to=settings.AUTH_USER_MODEL,
+                        verbose_name="Пользователь",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Обновление для сводки",
+                "verbose_name_plural": "Обновления для сводки",
+                "unique_together": {("user", "course")},
+            },
+        ),
+    ]
@@ -0,0 +1,58 @@
+# Generated by Django 5.2.1 on 2026-10-17 11:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("auth", "0012_alter_user_first_name_max_length"),
+        ("users", "0006_user_notification_mode_pendingcourseupdate"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="MaintenanceCheckpoint",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "name",
+                    models.CharField(
+                        max_length=100, unique=True, verbose_name="Задача"
+                    ),
+                ),
+                (
+                    "last_pk",
+                    models.BigIntegerField(
+                        default=0, verbose_name="Последний обработанный id"
+                    ),
+                ),
+                (
+                    "updated_at",
+                    models.DateTimeField(auto_now=True, verbose_name="Обновлено"),
+                ),
+            ],
+            options={
+                "verbose_name": "Контрольная точка обслуживания",
+                "verbose_name_plural": "Контрольные точки обслуживания",
+            },
+        ),
+        migrations.AddIndex(
+            model_name="user",
+            index=models.Index(
+                condition=models.Q(
+                    ("is_active", True), ("is_staff", False), ("is_superuser", False)
+                ),
+                fields=["last_login"],
+                name="user_active_last_login_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.1 on 2026-10-17 11:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("users", "0007_maintenancecheckpoint_and_more"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="payments",
+            name="stripe_error",
+            field=models.TextField(blank=True, null=True, verbose_name="Ошибка Stripe"),
+        ),
+        migrations.AlterField(
+            model_name="payments",
+            name="payment_status",
+            field=models.CharField(
+                choices=[
+                    ("pending", "Ожидает оплаты"),
+                    ("paid", "Оплачено"),
+                    ("canceled", "Отменено"),
+                    ("failed", "Ошибка оплаты"),
+                ],
+                default="pending",
+                max_length=10,
+                verbose_name="Статус платежа",
+            ),
+        ),
+    ]
@@ -0,0 +1,82 @@
+# Generated by Django 5.2.1 on 2026-10-17 11:53
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("materials", "0006_lesson_last_update"),
+        ("users", "0008_payments_stripe_error"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="StripePrice",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("product_id", models.CharField(max_length=100)),
+                (
+                    "unit_amount",
+                    models.PositiveIntegerField(verbose_name="Сумма в центах"),
+                ),
+                ("currency", models.CharField(max_length=3)),
+                ("price_id", models.CharField(max_length=100, unique=True)),
+            ],
+            options={
+                "verbose_name": "Цена Stripe",
+                "verbose_name_plural": "Цены Stripe",
+                "unique_together": {("product_id", "unit_amount", "currency")},
+            },
+        ),
+        migrations.CreateModel(
+            name="StripeProduct",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("product_id", models.CharField(max_length=100, unique=True)),
+                (
+                    "course",
+                    models.OneToOneField(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="stripe_product",
+                        to="materials.course",
+                        verbose_name="Курс",
+                    ),
+                ),
+                (
+                    "lesson",
+                    models.OneToOneField(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="stripe_product",
+                        to="materials.lesson",
+                        verbose_name="Урок",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Продукт Stripe",
+                "verbose_name_plural": "Продукты Stripe",
+            },
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 5.2.1 on 2026-10-17 11:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("materials", "0006_lesson_last_update"),
+        ("users", "0010_stripeevent_and_session_index"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="payments",
+            index=models.Index(
+                fields=["user", "payment_date", "id"], name="payment_user_date_id_idx"
+            ),
+        ),
+    ]
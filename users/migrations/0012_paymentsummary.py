@@ -0,0 +1,84 @@
+# Generated by Django 5.2.1 on 2026-10-17 12:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("users", "0011_payments_user_date_id_idx"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="PaymentSummary",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "course_id",
+                    models.PositiveIntegerField(default=0, verbose_name="Курс"),
+                ),
+                (
+                    "lesson_id",
+                    models.PositiveIntegerField(default=0, verbose_name="Урок"),
+                ),
+                ("day", models.DateField(verbose_name="День")),
+                (
+                    "payment_method",
+                    models.CharField(
+                        choices=[
+                            ("cash", "Наличные"),
+                            ("transfer", "Перевод на счет"),
+                            ("stripe", "Stripe"),
+                        ],
+                        max_length=10,
+                        verbose_name="Способ оплаты",
+                    ),
+                ),
+                (
+                    "payment_status",
+                    models.CharField(
+                        choices=[
+                            ("pending", "Ожидает оплаты"),
+                            ("paid", "Оплачено"),
+                            ("canceled", "Отменено"),
+                            ("failed", "Ошибка оплаты"),
+                        ],
+                        max_length=10,
+                        verbose_name="Статус платежа",
+                    ),
+                ),
+                (
+                    "payments_count",
+                    models.IntegerField(default=0, verbose_name="Число платежей"),
+                ),
+                (
+                    "revenue",
+                    models.DecimalField(
+                        decimal_places=2, default=0, max_digits=14, verbose_name="Сумма"
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Сводка платежей",
+                "verbose_name_plural": "Сводки платежей",
+                "unique_together": {
+                    (
+                        "day",
+                        "course_id",
+                        "lesson_id",
+                        "payment_method",
+                        "payment_status",
+                    )
+                },
+            },
+        ),
+    ]
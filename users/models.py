@@ -3,6 +3,11 @@ from django.db import models
 
 
 class User(AbstractUser):
+    NOTIFICATION_MODE_CHOICES = [
+        ("immediate", "Сразу"),
+        ("digest", "Ежедневная сводка"),
+    ]
+
     username = None
 
     email = models.EmailField(unique=True, verbose_name="Email")
@@ -16,6 +21,12 @@ class User(AbstractUser):
         null=True,
         verbose_name="Фото",
     )
+    notification_mode = models.CharField(
+        max_length=10,
+        choices=NOTIFICATION_MODE_CHOICES,
+        default="immediate",
+        verbose_name="Уведомления об обновлениях курсов",
+    )
 
     USERNAME_FIELD = "email"
     REQUIRED_FIELDS = []
@@ -23,6 +34,14 @@ class User(AbstractUser):
     class Meta:
         verbose_name = "Пользователь"
         verbose_name_plural = "Пользователи"
+        indexes = [
+            # Условие совпадает с фильтром users.tasks.checking_inactive_users
+            models.Index(
+                fields=["last_login"],
+                condition=models.Q(is_active=True, is_staff=False, is_superuser=False),
+                name="user_active_last_login_idx",
+            ),
+        ]
 
     def __str__(self):
         return self.email
@@ -38,6 +57,7 @@ class Payments(models.Model):
         ("pending", "Ожидает оплаты"),
         ("paid", "Оплачено"),
         ("canceled", "Отменено"),
+        ("failed", "Ошибка оплаты"),
     ]
     user = models.ForeignKey(
         User,
@@ -71,8 +91,11 @@ class Payments(models.Model):
 
     stripe_product_id = models.CharField(max_length=100, blank=True, null=True)
     stripe_price_id = models.CharField(max_length=100, blank=True, null=True)
-    stripe_session_id = models.CharField(max_length=100, blank=True, null=True)
+    stripe_session_id = models.CharField(
+        max_length=100, blank=True, null=True, db_index=True
+    )
     stripe_payment_link = models.URLField(max_length=500, blank=True, null=True)
+    stripe_error = models.TextField(blank=True, null=True, verbose_name="Ошибка Stripe")
     payment_status = models.CharField(
         max_length=10,
         choices=PAYMENT_STATUS_CHOICES,
@@ -84,11 +107,57 @@ class Payments(models.Model):
         verbose_name = "Платеж"
         verbose_name_plural = "Платежи"
         ordering = ["-payment_date"]
+        indexes = [
+            models.Index(fields=["payment_date", "id"], name="payment_date_id_idx"),
+            models.Index(
+                fields=["user", "payment_date", "id"], name="payment_user_date_id_idx"
+            ),
+        ]
 
     def __str__(self):
         return f"Платеж {self.user} на сумму {self.payment_amount}"
 
 
+class PaymentSummary(models.Model):
+    """
+    Сводка платежей по курсу, уроку, дню, способу оплаты и статусу.
+    Обновляется при изменении платежей (users.revenue), курс и урок хранятся
+    числом (0 - не указан), чтобы сводка не зависела от удаления материалов.
+    """
+
+    course_id = models.PositiveIntegerField(default=0, verbose_name="Курс")
+    lesson_id = models.PositiveIntegerField(default=0, verbose_name="Урок")
+    day = models.DateField(verbose_name="День")
+    payment_method = models.CharField(
+        max_length=10,
+        choices=Payments.PAYMENT_METHOD_CHOICES,
+        verbose_name="Способ оплаты",
+    )
+    payment_status = models.CharField(
+        max_length=10,
+        choices=Payments.PAYMENT_STATUS_CHOICES,
+        verbose_name="Статус платежа",
+    )
+    payments_count = models.IntegerField(default=0, verbose_name="Число платежей")
+    revenue = models.DecimalField(
+        max_digits=14, decimal_places=2, default=0, verbose_name="Сумма"
+    )
+
+    class Meta:
+        verbose_name = "Сводка платежей"
+        verbose_name_plural = "Сводки платежей"
+        unique_together = (
+            "day",
+            "course_id",
+            "lesson_id",
+            "payment_method",
+            "payment_status",
+        )
+
+    def __str__(self):
+        return f"{self.day}: {self.payments_count} платежей на {self.revenue}"
+
+
 class Subscription(models.Model):
     user = models.ForeignKey(
         User,
@@ -115,3 +184,111 @@ class Subscription(models.Model):
 
     def __str__(self):
         return f"{self.user} подписан на {self.course}"
+
+
+class PendingCourseUpdate(models.Model):
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        verbose_name="Пользователь",
+        related_name="pending_course_updates",
+    )
+    course = models.ForeignKey(
+        "materials.Course",
+        on_delete=models.CASCADE,
+        verbose_name="Курс",
+        related_name="pending_updates",
+    )
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Дата изменения")
+
+    class Meta:
+        verbose_name = "Обновление для сводки"
+        verbose_name_plural = "Обновления для сводки"
+        unique_together = ("user", "course")
+
+    def __str__(self):
+        return f"{self.course} для {self.user}"
+
+
+class StripeProduct(models.Model):
+    course = models.OneToOneField(
+        "materials.Course",
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        verbose_name="Курс",
+        related_name="stripe_product",
+    )
+    lesson = models.OneToOneField(
+        "materials.Lesson",
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        verbose_name="Урок",
+        related_name="stripe_product",
+    )
+    product_id = models.CharField(max_length=100, unique=True)
+
+    class Meta:
+        verbose_name = "Продукт Stripe"
+        verbose_name_plural = "Продукты Stripe"
+
+    def __str__(self):
+        return self.product_id
+
+
+class StripePrice(models.Model):
+    product_id = models.CharField(max_length=100)
+    unit_amount = models.PositiveIntegerField(verbose_name="Сумма в центах")
+    currency = models.CharField(max_length=3)
+    price_id = models.CharField(max_length=100, unique=True)
+
+    class Meta:
+        verbose_name = "Цена Stripe"
+        verbose_name_plural = "Цены Stripe"
+        unique_together = ("product_id", "unit_amount", "currency")
+
+    def __str__(self):
+        return self.price_id
+
+
+class StripeEvent(models.Model):
+    """Входящее событие Stripe. Записи только добавляются и отмечаются обработанными."""
+
+    event_id = models.CharField(max_length=100, unique=True)
+    type = models.CharField(max_length=100, verbose_name="Тип события")
+    session_id = models.CharField(max_length=100, blank=True, null=True)
+    payload = models.JSONField()
+    received_at = models.DateTimeField(auto_now_add=True, verbose_name="Получено")
+    processed_at = models.DateTimeField(
+        blank=True, null=True, verbose_name="Обработано"
+    )
+
+    class Meta:
+        verbose_name = "Событие Stripe"
+        verbose_name_plural = "События Stripe"
+        indexes = [
+            models.Index(
+                fields=["id"],
+                condition=models.Q(processed_at__isnull=True),
+                name="stripe_event_unprocessed_idx",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.type} {self.event_id}"
+
+
+class MaintenanceCheckpoint(models.Model):
+    name = models.CharField(max_length=100, unique=True, verbose_name="Задача")
+    last_pk = models.BigIntegerField(
+        default=0, verbose_name="Последний обработанный id"
+    )
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="Обновлено")
+
+    class Meta:
+        verbose_name = "Контрольная точка обслуживания"
+        verbose_name_plural = "Контрольные точки обслуживания"
+
+    def __str__(self):
+        return f"{self.name}: {self.last_pk}"
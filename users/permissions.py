@@ -1,18 +1,20 @@
 from rest_framework import permissions
 
+from users.roles import is_moderator
+
 
 class IsModerator(permissions.BasePermission):
 
     def has_permission(self, request, view):
-        return request.user.groups.filter(name="moderators").exists()
+        return is_moderator(request)
 
 
 class IsOwner(permissions.BasePermission):
 
     def has_object_permission(self, request, view, obj):
-        return obj.owner == request.user
+        return obj.owner_id == request.user.pk
 
 
 class IsProfileOwner(permissions.BasePermission):
     def has_object_permission(self, request, view, obj):
-        return obj == request.user
+        return obj.pk == request.user.pk
@@ -0,0 +1,107 @@
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import Coalesce, TruncDate
+from django.utils import timezone
+
+from users.models import Payments, PaymentSummary
+
+SUMMARY_FIELDS = ("course_id", "lesson_id", "day", "payment_method", "payment_status")
+# Поля платежа, от которых зависит его строка сводки
+SUMMARY_SOURCE_FIELDS = (
+    "paid_course",
+    "paid_lesson",
+    "payment_date",
+    "payment_method",
+    "payment_status",
+    "payment_amount",
+)
+
+
+def summary_key(payment):
+    """Ключ строки сводки, в которую входит платеж."""
+    return {
+        "course_id": payment.paid_course_id or 0,
+        "lesson_id": payment.paid_lesson_id or 0,
+        "day": timezone.localdate(payment.payment_date),
+        "payment_method": payment.payment_method,
+        "payment_status": payment.payment_status,
+    }
+
+
+def apply_delta(key, count, amount):
+    """
+    Атомарно прибавляет count платежей и amount выручки к строке сводки.
+    Если строки нет, она создается; при одновременном создании
+    проигравший процесс повторяет UPDATE.
+    """
+    updated = PaymentSummary.objects.filter(**key).update(
+        payments_count=F("payments_count") + count, revenue=F("revenue") + amount
+    )
+    if updated:
+        return
+    try:
+        with transaction.atomic():
+            PaymentSummary.objects.create(**key, payments_count=count, revenue=amount)
+    except IntegrityError:
+        apply_delta(key, count, amount)
+
+
+def update_payments_status(queryset, payment_status):
+    """
+    queryset.update(payment_status=...) с переносом затронутых платежей
+    между строками сводки. Вызывается внутри транзакции: платежи блокируются,
+    чтобы их статус не изменился между подсчетом и обновлением.
+    """
+    ids = list(
+        queryset.exclude(payment_status=payment_status)
+        .select_for_update()
+        .values_list("pk", flat=True)
+    )
+    payments = Payments.objects.filter(pk__in=ids)
+    for row in _group(payments):
+        old_key = {field: row[field] for field in SUMMARY_FIELDS}
+        apply_delta(old_key, -row["payments_count"], -row["revenue"])
+        apply_delta(
+            {**old_key, "payment_status": payment_status},
+            row["payments_count"],
+            row["revenue"],
+        )
+    return payments.update(payment_status=payment_status)
+
+
+def detach_summary(field, pk):
+    """
+    Переносит строки сводки удаляемого курса или урока (field - course_id или
+    lesson_id) в 0. Платежи теряют ссылку через SET_NULL одним UPDATE без
+    сигналов, поэтому дальнейшие изменения платежей считаются уже по 0.
+    """
+    rows = list(PaymentSummary.objects.select_for_update().filter(**{field: pk}))
+    for row in rows:
+        key = {name: getattr(row, name) for name in SUMMARY_FIELDS}
+        apply_delta({**key, field: 0}, row.payments_count, row.revenue)
+    PaymentSummary.objects.filter(pk__in=[row.pk for row in rows]).delete()
+
+
+def rebuild_summary():
+    """Полностью пересчитывает сводку по таблице платежей."""
+    with transaction.atomic():
+        PaymentSummary.objects.all().delete()
+        rows = PaymentSummary.objects.bulk_create(
+            (PaymentSummary(**row) for row in _group(Payments.objects.all())),
+            batch_size=1000,
+        )
+    return len(rows)
+
+
+def _group(queryset):
+    return (
+        queryset.order_by()
+        .values(
+            "payment_method",
+            "payment_status",
+            course_id=Coalesce("paid_course_id", 0),
+            lesson_id=Coalesce("paid_lesson_id", 0),
+            day=TruncDate("payment_date"),
+        )
+        .annotate(payments_count=Count("id"), revenue=Sum("payment_amount"))
+    )
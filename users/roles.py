@@ -0,0 +1,57 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from config.db_router import use_replica
+
+MODERATORS_GROUP = "moderators"
+
+# Утверждение JWT со списком ролей (users.serializers.UserTokenObtainPairSerializer)
+ROLES_CLAIM = "roles"
+
+
+def _roles_key(user_id):
+    return f"users:roles:{user_id}"
+
+
+def get_roles(request):
+    """
+    Роли (имена групп) текущего пользователя.
+    Вычисляются один раз на запрос и запоминаются на объекте запроса;
+    при USER_ROLES_CACHE_TIMEOUT > 0 дополнительно кэшируются между запросами.
+    """
+    user = request.user
+    if not user.is_authenticated:
+        return frozenset()
+    cached = getattr(request, "_user_roles", None)
+    if cached is not None and cached[0] == user.pk:
+        return cached[1]
+    # Пользователь из токена (users.authentication) несет роли в утверждениях
+    roles = getattr(user, ROLES_CLAIM, None)
+    if roles is None:
+        roles = _load_roles(user)
+    request._user_roles = (user.pk, roles)
+    return roles
+
+
+def is_moderator(request):
+    return MODERATORS_GROUP in get_roles(request)
+
+
+def invalidate_roles(*user_ids):
+    # Сброс откладывается до фиксации изменений групп
+    keys = [_roles_key(user_id) for user_id in user_ids]
+    transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+def _load_roles(user):
+    timeout = settings.USER_ROLES_CACHE_TIMEOUT
+    if not timeout:
+        return frozenset(user.groups.values_list("name", flat=True))
+    key = _roles_key(user.pk)
+    roles = cache.get(key)
+    if roles is None:
+        with use_replica(False):
+            roles = frozenset(user.groups.values_list("name", flat=True))
+        cache.set(key, roles, timeout)
+    return roles
@@ -1,7 +1,17 @@
+from django.conf import settings
+from django.db.models import Count, Window
 from rest_framework import serializers
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.serializers import (
+    TokenObtainPairSerializer,
+    TokenRefreshSerializer,
+)
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import AccessToken
 
 from materials.models import Course, Lesson
 from users.models import Payments, User, Subscription
+from users.roles import ROLES_CLAIM
 
 
 class PaymentSerializer(serializers.ModelSerializer):
@@ -22,6 +32,7 @@ class PaymentSerializer(serializers.ModelSerializer):
             "stripe_price_id",
             "stripe_session_id",
             "stripe_payment_link",
+            "stripe_error",
         )
 
     def create(self, validated_data):
@@ -35,6 +46,43 @@ class PaymentSerializer(serializers.ModelSerializer):
         return super().create(validated_data)
 
 
+class PaymentHistorySerializer(serializers.ModelSerializer):
+    """Платеж в истории пользователя: только поля, нужные для отображения."""
+
+    class Meta:
+        model = Payments
+        fields = [
+            "id",
+            "payment_date",
+            "paid_course",
+            "paid_lesson",
+            "payment_amount",
+            "payment_method",
+            "payment_status",
+            "stripe_payment_link",
+        ]
+        read_only_fields = fields
+
+
+class PaymentSummarySerializer(serializers.Serializer):
+    """Строка отчета по сводке платежей; присутствуют только поля группировки."""
+
+    course_id = serializers.IntegerField(required=False)
+    lesson_id = serializers.IntegerField(required=False)
+    day = serializers.DateField(required=False)
+    payment_method = serializers.CharField(required=False)
+    payment_status = serializers.CharField(required=False)
+    payments_count = serializers.IntegerField()
+    revenue = serializers.DecimalField(max_digits=14, decimal_places=2)
+
+
+class PaymentStatusSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Payments
+        fields = ["id", "payment_status", "stripe_payment_link", "stripe_error"]
+        read_only_fields = fields
+
+
 class UserPublicSerializer(serializers.ModelSerializer):
     class Meta:
         model = User
@@ -47,12 +95,32 @@ class UserPrivateSerializer(serializers.ModelSerializer):
 
     @staticmethod
     def get_payment_history(obj):
-        payments = obj.payments.all().order_by("-payment_date")
-        return PaymentSerializer(payments, many=True).data
+        """
+        Последние PROFILE_PAYMENTS_LIMIT платежей и их общее число одним запросом.
+        Полная история доступна в /users/profile/payments/.
+        """
+        payments = list(
+            Payments.objects.filter(user_id=obj.pk)
+            .only(*PaymentHistorySerializer.Meta.fields)
+            .annotate(total=Window(Count("id")))
+            .order_by("-payment_date", "-id")[: settings.PROFILE_PAYMENTS_LIMIT]
+        )
+        return {
+            "count": payments[0].total if payments else 0,
+            "results": PaymentHistorySerializer(payments, many=True).data,
+        }
 
     class Meta:
         model = User
-        fields = ["email", "password", "phone", "city", "avatar", "payment_history"]
+        fields = [
+            "email",
+            "password",
+            "phone",
+            "city",
+            "avatar",
+            "notification_mode",
+            "payment_history",
+        ]
         extra_kwargs = {"password": {"write_only": True}}
 
 
@@ -64,3 +132,82 @@ class SubscriptionSerializer(serializers.ModelSerializer):
     class Meta:
         model = Subscription
         fields = "__all__"
+
+
+class BulkSubscriptionSerializer(serializers.Serializer):
+    """Списки id курсов для пакетной подписки и отписки."""
+
+    subscribe = serializers.ListField(
+        child=serializers.IntegerField(min_value=1), default=list, max_length=500
+    )
+    unsubscribe = serializers.ListField(
+        child=serializers.IntegerField(min_value=1), default=list, max_length=500
+    )
+
+    def validate(self, attrs):
+        subscribe, unsubscribe = set(attrs["subscribe"]), set(attrs["unsubscribe"])
+        if subscribe & unsubscribe:
+            raise serializers.ValidationError(
+                "Курс не может быть одновременно в subscribe и unsubscribe"
+            )
+        # Все id проверяются одним запросом с IN
+        requested = subscribe | unsubscribe
+        found = set(
+            Course.objects.filter(pk__in=requested).values_list("pk", flat=True)
+        )
+        if requested - found:
+            raise serializers.ValidationError(
+                {"course_ids": f"Курсы не найдены: {sorted(requested - found)}"}
+            )
+        return {"subscribe": subscribe, "unsubscribe": unsubscribe}
+
+
+def add_user_claims(access, user):
+    """
+    Добавляет в токен доступа is_staff и роли для аутентификации без запроса
+    к БД. В refresh-токен они не пишутся: иначе копировались бы в каждый
+    обновленный токен доступа и не отражали бы изменения прав.
+    """
+    token = AccessToken(access, verify=False)
+    token["is_staff"] = user.is_staff
+    token[ROLES_CLAIM] = [group.name for group in user.groups.all()]
+    return str(token)
+
+
+class UserTokenObtainPairSerializer(TokenObtainPairSerializer):
+    def validate(self, attrs):
+        data = super().validate(attrs)
+        data["access"] = add_user_claims(data["access"], self.user)
+        return data
+
+
+class UserTokenRefreshSerializer(TokenRefreshSerializer):
+    """
+    Роли и is_staff перечитываются из БД при каждом обновлении токена.
+    В отличие от TokenRefreshSerializer.validate пользователь загружается
+    один раз вместе с группами и служит и для проверки, и для утверждений.
+    """
+
+    def validate(self, attrs):
+        refresh = self.token_class(attrs["refresh"])
+        user_id = refresh.payload.get(api_settings.USER_ID_CLAIM)
+        user = (
+            User.objects.prefetch_related("groups")
+            .filter(**{api_settings.USER_ID_FIELD: user_id})
+            .first()
+        )
+        if user is None or not api_settings.USER_AUTHENTICATION_RULE(user):
+            raise AuthenticationFailed(
+                self.error_messages["no_active_account"], "no_active_account"
+            )
+
+        data = {"access": add_user_claims(str(refresh.access_token), user)}
+        if api_settings.ROTATE_REFRESH_TOKENS:
+            if api_settings.BLACKLIST_AFTER_ROTATION and hasattr(refresh, "blacklist"):
+                refresh.blacklist()
+            refresh.set_jti()
+            refresh.set_exp()
+            refresh.set_iat()
+            refresh.outstand()
+            data["refresh"] = str(refresh)
+        return data
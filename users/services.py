@@ -1,30 +1,280 @@
+import json
+import logging
+import threading
+from collections import OrderedDict
+from itertools import count
+from types import SimpleNamespace
+
 import stripe
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.utils.module_loading import import_string
+
+from users.models import StripeEvent, StripePrice, StripeProduct
+
+logger = logging.getLogger(__name__)
+
+CURRENCY = "usd"
+
+
+class StripeGateway:
+    """
+    Обращения к Stripe через один клиент на процесс.
+    Клиент создается при первом вызове, а не при импорте, и использует
+    пул HTTP-соединений requests с таймаутом и повторами из настроек.
+    """
+
+    def __init__(self):
+        self._client = None
+        self._lock = threading.Lock()
+
+    @property
+    def client(self):
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    self._client = stripe.StripeClient(
+                        settings.STRIPE_API_KEY,
+                        http_client=stripe.RequestsClient(
+                            timeout=settings.STRIPE_TIMEOUT
+                        ),
+                        max_network_retries=settings.STRIPE_MAX_NETWORK_RETRIES,
+                    )
+        return self._client
+
+    def create_product(self, name, idempotency_key=None):
+        return self.client.products.create(
+            params={"name": name}, options=_options(idempotency_key)
+        )
+
+    def create_price(self, unit_amount, product_id, idempotency_key=None):
+        return self.client.prices.create(
+            params={
+                "currency": CURRENCY,
+                "unit_amount": unit_amount,
+                "product": product_id,
+            },
+            options=_options(idempotency_key),
+        )
+
+    def create_session(self, price_id, idempotency_key=None):
+        return self.client.checkout.sessions.create(
+            params={
+                "success_url": "http://127.0.0.1:8000/",
+                "line_items": [{"price": price_id, "quantity": 1}],
+                "mode": "payment",
+            },
+            options=_options(idempotency_key),
+        )
+
+
+class FakeStripeGateway:
+    """
+    Замена StripeGateway без обращений к сети для локального запуска и тестов.
+    Запоминает вызовы и возвращает объекты с последовательными id.
+    """
+
+    def __init__(self):
+        self.calls = []
+        self._ids = count(1)
+
+    def create_product(self, name, idempotency_key=None):
+        return self._create("prod", name=name, idempotency_key=idempotency_key)
+
+    def create_price(self, unit_amount, product_id, idempotency_key=None):
+        return self._create(
+            "price",
+            unit_amount=unit_amount,
+            product=product_id,
+            idempotency_key=idempotency_key,
+        )
+
+    def create_session(self, price_id, idempotency_key=None):
+        return self._create("cs", price=price_id, idempotency_key=idempotency_key)
+
+    def _create(self, prefix, **params):
+        self.calls.append((prefix, params))
+        object_id = f"{prefix}_{next(self._ids)}"
+        return SimpleNamespace(
+            id=object_id, url=f"https://checkout.stripe.test/{object_id}"
+        )
+
+
+def _options(idempotency_key):
+    return {"idempotency_key": idempotency_key} if idempotency_key else {}
+
+
+_gateway = None
+
+
+def get_gateway():
+    """Шлюз Stripe, класс которого задан настройкой STRIPE_GATEWAY."""
+    global _gateway
+    if _gateway is None:
+        _gateway = import_string(settings.STRIPE_GATEWAY)()
+    return _gateway
 
-from config.settings import STRIPE_API_KEY
 
-stripe.api_key = STRIPE_API_KEY
-product = stripe.Product.create(name="Gold Plan")
+def reset_gateway():
+    global _gateway
+    _gateway = None
+    stripe_ids.clear()
 
 
-def create_stripe_product(course):
+class LRUCache:
+    """Небольшой потокобезопасный LRU-кэш в памяти процесса."""
+
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            if key not in self._data:
+                return None
+            self._data.move_to_end(key)
+            return self._data[key]
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            if len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+stripe_ids = LRUCache()
+
+
+def create_stripe_product(item, idempotency_key=None):
     """Создание stripe продукта."""
-    return stripe.Product.create(name=course.name)
+    return get_gateway().create_product(item.name, idempotency_key=idempotency_key)
 
 
-def create_stripe_price(amount, product_id):
+def create_stripe_price(amount, product_id, idempotency_key=None):
     """Создание stripe цены."""
-    return stripe.Price.create(
-        currency="usd",
-        unit_amount=int(amount * 100),
-        product=product_id,
+    return get_gateway().create_price(
+        int(amount * 100), product_id, idempotency_key=idempotency_key
     )
 
 
-def create_stripe_session(price_id):
+def create_stripe_session(price_id, idempotency_key=None):
     """Создание сессии на оплату в stripe."""
-    session = stripe.checkout.Session.create(
-        success_url="http://127.0.0.1:8000/",
-        line_items=[{"price": price_id, "quantity": 1}],
-        mode="payment",
+    return get_gateway().create_session(price_id, idempotency_key=idempotency_key)
+
+
+def get_stripe_product_id(item):
+    """
+    Id продукта Stripe для курса или урока. Продукт создается один раз
+    и сохраняется в StripeProduct, повторные обращения читаются из LRU-кэша.
+    """
+    field = item._meta.model_name
+    key = f"product:{field}:{item.pk}"
+    product_id = stripe_ids.get(key)
+    if product_id is None:
+        product_id = _get_or_create(
+            StripeProduct,
+            {field: item},
+            "product_id",
+            lambda: create_stripe_product(item, idempotency_key=key),
+        )
+        stripe_ids.set(key, product_id)
+    return product_id
+
+
+def get_stripe_price_id(amount, product_id):
+    """Id цены Stripe для продукта и суммы, создается один раз аналогично продукту."""
+    unit_amount = int(amount * 100)
+    key = f"price:{product_id}:{unit_amount}:{CURRENCY}"
+    price_id = stripe_ids.get(key)
+    if price_id is None:
+        price_id = _get_or_create(
+            StripePrice,
+            {
+                "product_id": product_id,
+                "unit_amount": unit_amount,
+                "currency": CURRENCY,
+            },
+            "price_id",
+            lambda: create_stripe_price(amount, product_id, idempotency_key=key),
+        )
+        stripe_ids.set(key, price_id)
+    return price_id
+
+
+def _get_or_create(model, lookup, id_field, create):
+    """
+    Одновременное первое создание одной записи безопасно: Stripe по ключу
+    идемпотентности вернет тот же объект, а уникальное ограничение в БД
+    оставит одну строку, которую прочитает проигравший процесс.
+    """
+    stripe_id = model.objects.filter(**lookup).values_list(id_field, flat=True).first()
+    if stripe_id is not None:
+        return stripe_id
+    stripe_id = create().id
+    try:
+        with transaction.atomic():
+            model.objects.create(**lookup, **{id_field: stripe_id})
+    except IntegrityError:
+        return model.objects.filter(**lookup).values_list(id_field, flat=True).get()
+    return stripe_id
+
+
+def parse_webhook(payload, signature):
+    """
+    Проверяет подпись вебхука Stripe и возвращает событие в виде словаря.
+    При неверной подписи выбрасывает stripe.SignatureVerificationError,
+    без секрета или при событии без id и type - ValueError.
+    """
+    if not settings.STRIPE_WEBHOOK_SECRET:
+        logger.error("Вебхук Stripe отклонен: STRIPE_WEBHOOK_SECRET не задан")
+        raise ValueError("STRIPE_WEBHOOK_SECRET не задан")
+    payload = payload.decode("utf-8")
+    stripe.WebhookSignature.verify_header(
+        payload, signature, settings.STRIPE_WEBHOOK_SECRET
+    )
+    event = json.loads(payload)
+    if not isinstance(event, dict) or not event.get("id") or not event.get("type"):
+        raise ValueError("Событие Stripe без id или type")
+    return event
+
+
+def store_stripe_events(events):
+    """
+    Сохраняет события во входящую таблицу одним INSERT.
+    Повторно доставленные события отбрасываются по event_id.
+    """
+    StripeEvent.objects.bulk_create(
+        [
+            StripeEvent(
+                event_id=event["id"],
+                type=event["type"],
+                session_id=_session_id(event),
+                payload=event,
+            )
+            for event in events
+        ],
+        ignore_conflicts=True,
     )
-    return session
+
+
+def schedule_stripe_events():
+    """Планирует одно применение событий на окно STRIPE_EVENTS_DELAY."""
+    from users.tasks import apply_stripe_events
+
+    delay = settings.STRIPE_EVENTS_DELAY
+    if cache.add("users:stripe_events:scheduled", True, delay):
+        transaction.on_commit(lambda: apply_stripe_events.apply_async(countdown=delay))
+
+
+def _session_id(event):
+    obj = event.get("data", {}).get("object", {})
+    if obj.get("object") == "checkout.session":
+        return obj.get("id")
+    return None
@@ -0,0 +1,93 @@
+from django.contrib.auth.models import Group
+from django.db.models.signals import (
+    m2m_changed,
+    post_delete,
+    post_save,
+    pre_delete,
+    pre_save,
+)
+from django.dispatch import receiver
+
+from materials.models import Course, Lesson
+from users.authentication import invalidate_cached_user
+from users.cache import invalidate_public_profile
+from users.models import Payments, User
+from users.revenue import (
+    SUMMARY_SOURCE_FIELDS,
+    apply_delta,
+    detach_summary,
+    summary_key,
+)
+from users.roles import invalidate_roles
+
+
+@receiver(m2m_changed, sender=User.groups.through)
+def invalidate_changed_user_roles(sender, instance, action, reverse, pk_set, **kwargs):
+    """Сбрасывает кэш ролей при изменении состава групп пользователя."""
+    if action not in ("post_add", "post_remove", "pre_clear"):
+        return
+    if not reverse:
+        invalidate_roles(instance.pk)
+    elif action == "pre_clear":
+        invalidate_roles(*instance.user_set.values_list("pk", flat=True))
+    else:
+        invalidate_roles(*pk_set)
+
+
+@receiver(post_save, sender=Group)
+@receiver(pre_delete, sender=Group)
+def invalidate_group_roles(sender, instance, **kwargs):
+    """Переименование или удаление группы меняет роли всех ее участников."""
+    invalidate_roles(*instance.user_set.values_list("pk", flat=True))
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_user_cache(sender, instance, **kwargs):
+    # Включает смену аватара: ImageField сохраняется вместе с пользователем
+    invalidate_cached_user(instance.pk)
+    invalidate_public_profile(instance.pk)
+
+
+@receiver(pre_save, sender=Payments)
+def remember_payment_summary(sender, instance, update_fields=None, **kwargs):
+    """Запоминает строку сводки и сумму платежа до изменения."""
+    instance._previous_summary = None
+    changed = SUMMARY_SOURCE_FIELDS if update_fields is None else update_fields
+    instance._skip_summary = not set(changed) & set(SUMMARY_SOURCE_FIELDS)
+    if instance.pk is None or instance._skip_summary:
+        return
+    previous = (
+        Payments.objects.filter(pk=instance.pk).only(*SUMMARY_SOURCE_FIELDS).first()
+    )
+    if previous is not None:
+        instance._previous_summary = (summary_key(previous), previous.payment_amount)
+
+
+@receiver(post_save, sender=Payments)
+def update_payment_summary(sender, instance, **kwargs):
+    """Переносит платеж между строками сводки при создании и изменении."""
+    if getattr(instance, "_skip_summary", False):
+        return
+    key, amount = summary_key(instance), instance.payment_amount
+    previous = getattr(instance, "_previous_summary", None)
+    if previous == (key, amount):
+        return
+    if previous is not None:
+        apply_delta(previous[0], -1, -previous[1])
+    apply_delta(key, 1, amount)
+
+
+@receiver(post_delete, sender=Payments)
+def remove_payment_summary(sender, instance, **kwargs):
+    apply_delta(summary_key(instance), -1, -instance.payment_amount)
+
+
+@receiver(pre_delete, sender=Course)
+def detach_course_summary(sender, instance, **kwargs):
+    detach_summary("course_id", instance.pk)
+
+
+@receiver(pre_delete, sender=Lesson)
+def detach_lesson_summary(sender, instance, **kwargs):
+    detach_summary("lesson_id", instance.pk)
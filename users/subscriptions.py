@@ -0,0 +1,47 @@
+from django.db import transaction
+
+from materials.cache import invalidate_subscriptions
+from materials.counters import shift_counter
+from users.models import Subscription, User
+
+
+def lock_user_subscriptions(user_id):
+    """
+    Блокирует строку пользователя до конца транзакции: все изменения
+    подписок одного пользователя (одиночные и пакетные) выполняются по очереди.
+    """
+    User.objects.select_for_update().filter(pk=user_id).exists()
+
+
+def apply_subscriptions(user, subscribe, unsubscribe):
+    """
+    Подписывает пользователя на курсы subscribe и отписывает от unsubscribe
+    в одной транзакции. Строка пользователя блокируется, поэтому добавленные
+    строки совпадают с вычисленными до вставки и счетчики подписчиков не
+    расходятся при параллельных запросах того же пользователя.
+    Возвращает добавленные, удаленные и все текущие подписки пользователя.
+    """
+    with transaction.atomic():
+        lock_user_subscriptions(user.pk)
+        existing = set(
+            Subscription.objects.filter(
+                user_id=user.pk, course_id__in=[*subscribe, *unsubscribe]
+            ).values_list("course_id", flat=True)
+        )
+        added = sorted(set(subscribe) - existing)
+        removed = sorted(set(unsubscribe) & existing)
+
+        Subscription.objects.bulk_create(
+            [Subscription(user_id=user.pk, course_id=pk) for pk in added],
+            ignore_conflicts=True,
+        )
+        # Счетчики удаленных подписок уменьшаются сигналом post_delete
+        Subscription.objects.filter(user_id=user.pk, course_id__in=removed).delete()
+        shift_counter("subscribers_count", added, 1)
+        subscribed = sorted(
+            Subscription.objects.filter(user_id=user.pk).values_list(
+                "course_id", flat=True
+            )
+        )
+    invalidate_subscriptions(user.pk)
+    return {"added": added, "removed": removed, "subscribed": subscribed}
@@ -1,14 +1,178 @@
+import logging
 from datetime import timedelta
-from django.utils import timezone
+
+import stripe
 from celery import shared_task
+from django.conf import settings
+from django.db import transaction
 from django.contrib.auth import get_user_model
+from django.utils import timezone
+
+from users.maintenance import run_batched
+from users.models import Payments, StripeEvent
+from users.revenue import update_payments_status
+from users.services import (
+    create_stripe_session,
+    get_stripe_price_id,
+    get_stripe_product_id,
+)
+
+logger = logging.getLogger(__name__)
 
 
 @shared_task
 def checking_inactive_users():
     User = get_user_model()
     inactive_period = timezone.now() - timedelta(days=30)
-    inactive_users = User.objects.filter(last_login__lt=inactive_period, is_active=True, is_staff=False,
-                                         is_superuser=False)
-    count = inactive_users.update(is_active=False)
-    return f"Заблокировано {count} неактивных пользователей"
+    inactive_users = User.objects.filter(
+        last_login__lt=inactive_period,
+        is_active=True,
+        is_staff=False,
+        is_superuser=False,
+    )
+    report = run_batched(
+        "checking_inactive_users",
+        inactive_users,
+        lambda batch: batch.update(is_active=False),
+        batch_size=settings.MAINTENANCE_BATCH_SIZE,
+        pause=settings.MAINTENANCE_BATCH_PAUSE,
+    )
+    return (
+        f"Заблокировано {report.rows} неактивных пользователей "
+        f"({report.rows_per_second:.0f} строк/с)"
+    )
+
+
+@shared_task(bind=True, max_retries=5)
+def create_payment_session(self, payment_id):
+    """
+    Создает сессию оплаты в Stripe для платежа. Продукт и цена берутся
+    из сохраненных соответствий и создаются в Stripe только в первый раз.
+    Ключ идемпотентности сессии привязан к платежу: повтор задачи после
+    обрыва соединения получит ту же сессию, а не создаст вторую.
+    """
+    payment = (
+        Payments.objects.select_related("paid_course", "paid_lesson")
+        .filter(pk=payment_id, payment_status="pending")
+        .first()
+    )
+    if payment is None or payment.stripe_session_id:
+        return "Платеж уже обработан"
+    item = payment.paid_course or payment.paid_lesson
+    if item is None:
+        return _fail_payment(payment, "Оплачиваемый курс или урок удален")
+
+    try:
+        product_id = get_stripe_product_id(item)
+        price_id = get_stripe_price_id(payment.payment_amount, product_id)
+        session = create_stripe_session(
+            price_id, idempotency_key=f"session:payment:{payment.pk}"
+        )
+    except (stripe.APIConnectionError, stripe.RateLimitError) as exc:
+        if self.request.retries < self.max_retries:
+            raise self.retry(exc=exc, countdown=2**self.request.retries * 5)
+        return _fail_payment(payment, exc)
+    except stripe.StripeError as exc:
+        return _fail_payment(payment, exc)
+
+    payment.stripe_product_id = product_id
+    payment.stripe_price_id = price_id
+    payment.stripe_session_id = session.id
+    payment.stripe_payment_link = session.url
+    payment.save(
+        update_fields=[
+            "stripe_product_id",
+            "stripe_price_id",
+            "stripe_session_id",
+            "stripe_payment_link",
+        ]
+    )
+    return f"Создана сессия оплаты для платежа {payment_id}"
+
+
+def _fail_payment(payment, exc):
+    payment.payment_status = "failed"
+    payment.stripe_error = str(exc)
+    payment.save(update_fields=["payment_status", "stripe_error"])
+    return f"Ошибка при создании платежа {payment.pk}: {exc}"
+
+
+# Статус платежа по типу события сессии оплаты
+STRIPE_EVENT_STATUSES = {
+    "checkout.session.completed": "paid",
+    "checkout.session.async_payment_succeeded": "paid",
+    "checkout.session.async_payment_failed": "failed",
+    "checkout.session.expired": "canceled",
+}
+# Сессия завершена, но при отложенных способах оплаты деньги еще не получены:
+# итог придет событием async_payment_succeeded или async_payment_failed
+STRIPE_PAID_SESSION_STATUSES = ("paid", "no_payment_required")
+
+
+def _event_payment_status(event_type, session_payment_status):
+    if (
+        event_type == "checkout.session.completed"
+        and session_payment_status not in STRIPE_PAID_SESSION_STATUSES
+    ):
+        return None
+    return STRIPE_EVENT_STATUSES.get(event_type)
+
+
+@shared_task
+def apply_stripe_events():
+    """
+    Применяет необработанные события Stripe к платежам пачками по
+    STRIPE_EVENTS_BATCH_SIZE. Для каждой сессии берется последнее событие
+    пачки, платежи обновляются одним UPDATE на каждый итоговый статус.
+    Оплаченный платеж не переводится в отмененный или ошибочный, поэтому
+    завершенная, но еще не оплаченная сессия оставляет платеж в ожидании.
+    """
+    applied = 0
+    while True:
+        with transaction.atomic():
+            events = list(
+                StripeEvent.objects.filter(processed_at__isnull=True)
+                .select_for_update(skip_locked=True)
+                .order_by("id")
+                .values_list(
+                    "id",
+                    "type",
+                    "session_id",
+                    "payload__data__object__payment_status",
+                )[: settings.STRIPE_EVENTS_BATCH_SIZE]
+            )
+            if not events:
+                break
+
+            statuses = {}
+            for _, event_type, session_id, session_payment_status in events:
+                payment_status = _event_payment_status(
+                    event_type, session_payment_status
+                )
+                if session_id and payment_status:
+                    statuses[session_id] = payment_status
+            sessions_by_status = {}
+            for session_id, payment_status in statuses.items():
+                sessions_by_status.setdefault(payment_status, []).append(session_id)
+
+            unmatched = set(statuses) - set(
+                Payments.objects.filter(stripe_session_id__in=statuses).values_list(
+                    "stripe_session_id", flat=True
+                )
+            )
+            if unmatched:
+                logger.warning(
+                    "События Stripe для неизвестных сессий: %s", sorted(unmatched)
+                )
+
+            for payment_status, session_ids in sessions_by_status.items():
+                payments = Payments.objects.filter(stripe_session_id__in=session_ids)
+                if payment_status != "paid":
+                    payments = payments.exclude(payment_status="paid")
+                update_payments_status(payments, payment_status)
+
+            StripeEvent.objects.filter(id__in=[event[0] for event in events]).update(
+                processed_at=timezone.now()
+            )
+        applied += len(events)
+    return f"Применено {applied} событий Stripe"
@@ -1,9 +1,56 @@
+import hmac
+import io
+import json
+import os
+import tempfile
+import time
+from datetime import timedelta
+from hashlib import sha256
+from types import SimpleNamespace
+from unittest import mock
+
+import stripe
+from celery.signals import task_postrun
+from django.contrib.auth.models import Group
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
 from rest_framework import status
+from rest_framework.request import Request
 from rest_framework.reverse import reverse
-from rest_framework.test import APITestCase
+from rest_framework.test import APIRequestFactory, APITestCase
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
 
-from materials.models import Course
-from users.models import User, Subscription
+from materials.models import Course, Lesson
+from users.maintenance import run_batched
+from users.models import (
+    MaintenanceCheckpoint,
+    Payments,
+    PaymentSummary,
+    StripeEvent,
+    StripeProduct,
+    Subscription,
+    User,
+)
+from users.services import (
+    get_gateway,
+    get_stripe_product_id,
+    reset_gateway,
+    stripe_ids,
+    store_stripe_events,
+    StripeGateway,
+)
+from users.permissions import IsOwner
+from users.revenue import update_payments_status
+from users.roles import ROLES_CLAIM, is_moderator
+from users.tasks import (
+    apply_stripe_events,
+    checking_inactive_users,
+    create_payment_session,
+)
 
 
 class SubscriptionTestCase(APITestCase):
@@ -44,3 +91,748 @@ class SubscriptionTestCase(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
         self.assertEqual(response.data["error"], "course_id is required")
         self.assertEqual(Subscription.objects.count(), 0)
+
+
+class RolesTestCase(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(email="moderator@mail.com")
+        self.moderators = Group.objects.create(name="moderators")
+        self.user.groups.add(self.moderators)
+        self.factory = APIRequestFactory()
+
+    def _request(self):
+        request = Request(self.factory.get("/"))
+        request.user = self.user
+        return request
+
+    def test_roles_resolved_once_per_request(self):
+        """Проверка, что группы пользователя запрашиваются один раз за запрос"""
+        request = self._request()
+        with self.assertNumQueries(1):
+            for _ in range(3):
+                self.assertTrue(is_moderator(request))
+
+    def test_roles_cached_between_requests(self):
+        """Проверка кэширования ролей между запросами и сброса при смене групп"""
+        self.assertTrue(is_moderator(self._request()))
+        with self.assertNumQueries(0):
+            self.assertTrue(is_moderator(self._request()))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.groups.remove(self.moderators)
+        self.assertFalse(is_moderator(self._request()))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.moderators.user_set.add(self.user)
+        self.assertTrue(is_moderator(self._request()))
+
+    def test_is_owner_does_not_load_owner(self):
+        """Проверка сравнения владельца по owner_id без загрузки пользователя"""
+        course = Course.objects.create(name="Курс", owner=self.user)
+        course = Course.objects.get(pk=course.pk)
+        with self.assertNumQueries(0):
+            self.assertTrue(
+                IsOwner().has_object_permission(self._request(), None, course)
+            )
+
+
+class StatelessAuthenticationTestCase(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(email="reader@mail.com")
+        self.user.set_password("12345qwerty")
+        self.user.save()
+        self.user.groups.add(Group.objects.create(name="moderators"))
+        response = self.client.post(
+            reverse("users:login"),
+            {"email": "reader@mail.com", "password": "12345qwerty"},
+        )
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {response.data['access']}")
+        self.refresh = response.data["refresh"]
+
+    def test_refresh_reloads_roles(self):
+        """Проверка, что роли берутся из БД при обновлении токена, а не из refresh"""
+        self.assertNotIn(ROLES_CLAIM, RefreshToken(self.refresh))
+        self.user.groups.clear()
+        response = self.client.post(
+            reverse("users:token_refresh"), {"refresh": self.refresh}
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        access = AccessToken(response.data["access"])
+        self.assertEqual(access[ROLES_CLAIM], [])
+        self.assertFalse(access["is_staff"])
+
+    def test_refresh_loads_user_once(self):
+        """Проверка загрузки пользователя с группами одним обращением при обновлении"""
+        with self.assertNumQueries(2):
+            response = self.client.post(
+                reverse("users:token_refresh"), {"refresh": self.refresh}
+            )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            AccessToken(response.data["access"])[ROLES_CLAIM], ["moderators"]
+        )
+
+    def test_refresh_for_deleted_user(self):
+        """Проверка отказа в обновлении токена удаленного пользователя"""
+        self.user.delete()
+        response = self.client.post(
+            reverse("users:token_refresh"), {"refresh": self.refresh}
+        )
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_read_without_user_query(self):
+        """Проверка, что чтение не обращается к таблице пользователей"""
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse("materials:lessons_list"))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertFalse(
+            any("users_user" in query["sql"] for query in queries.captured_queries)
+        )
+
+    def test_write_loads_cached_user(self):
+        """Проверка, что запись загружает пользователя один раз и берет его из кэша"""
+        course = Course.objects.create(name="Курс")
+        url = reverse("users:subscriptions")
+        for expected_user_queries in (1, 0):
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.post(url, {"course_id": course.pk})
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            # Блокировка строки пользователя (lock_user_subscriptions) не загружает его
+            user_queries = [
+                query
+                for query in queries.captured_queries
+                if '"users_user"."password"' in query["sql"]
+            ]
+            self.assertEqual(len(user_queries), expected_user_queries)
+
+
+@override_settings(MAINTENANCE_BATCH_SIZE=2, MAINTENANCE_BATCH_PAUSE=0)
+class InactiveUsersTestCase(TestCase):
+    def setUp(self):
+        old_login = timezone.now() - timedelta(days=60)
+        self.inactive = [
+            User.objects.create(email=f"old{number}@mail.com", last_login=old_login)
+            for number in range(5)
+        ]
+        self.active = User.objects.create(
+            email="new@mail.com", last_login=timezone.now()
+        )
+        self.staff = User.objects.create(
+            email="staff@mail.com", last_login=old_login, is_staff=True
+        )
+
+    def test_deactivates_in_batches(self):
+        """Проверка блокировки неактивных пользователей пачками"""
+        result = checking_inactive_users()
+        self.assertIn("Заблокировано 5", result)
+        self.assertFalse(
+            User.objects.filter(
+                pk__in=[user.pk for user in self.inactive], is_active=True
+            ).exists()
+        )
+        self.active.refresh_from_db()
+        self.staff.refresh_from_db()
+        self.assertTrue(self.active.is_active)
+        self.assertTrue(self.staff.is_active)
+        self.assertFalse(MaintenanceCheckpoint.objects.exists())
+
+    def test_resumes_from_checkpoint(self):
+        """Проверка продолжения с контрольной точки после сбоя"""
+        processed = []
+
+        def failing_action(batch):
+            if processed:
+                raise RuntimeError("сбой")
+            processed.extend(batch.values_list("pk", flat=True))
+            return batch.update(last_name="обработан")
+
+        queryset = User.objects.filter(pk__in=[user.pk for user in self.inactive])
+        with self.assertRaises(RuntimeError):
+            run_batched("test", queryset, failing_action, batch_size=2, pause=0)
+        checkpoint = MaintenanceCheckpoint.objects.get(name="test")
+        self.assertEqual(checkpoint.last_pk, self.inactive[1].pk)
+
+        report = run_batched(
+            "test",
+            queryset,
+            lambda batch: batch.update(last_name="обработан"),
+            batch_size=2,
+            pause=0,
+        )
+        self.assertEqual(report.rows, 3)
+        self.assertEqual(queryset.filter(last_name="обработан").count(), 5)
+
+    def test_releases_connections_after_task(self):
+        """Проверка возврата соединений с базой после задачи обслуживания"""
+        idle, busy = mock.Mock(in_atomic_block=False), mock.Mock(in_atomic_block=True)
+        with mock.patch(
+            "config.celery.connections.all", return_value=[idle, busy]
+        ) as all_connections:
+            task_postrun.send(sender=create_payment_session)
+            all_connections.assert_not_called()
+
+            task_postrun.send(sender=checking_inactive_users)
+        idle.close.assert_called_once_with()
+        busy.close.assert_not_called()
+
+
+@override_settings(STRIPE_GATEWAY="users.services.FakeStripeGateway")
+class PaymentTestCase(APITestCase):
+    def setUp(self):
+        reset_gateway()
+        self.addCleanup(reset_gateway)
+        self.gateway = get_gateway()
+        self.user = User.objects.create(email="payer@mail.com")
+        self.course = Course.objects.create(name="Платный курс")
+        self.client.force_authenticate(user=self.user)
+
+    def _create_payment(self):
+        with mock.patch("users.views.create_payment_session.delay") as delay:
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.post(
+                    reverse("users:payments-list"),
+                    {
+                        "paid_course": self.course.pk,
+                        "payment_amount": "10.50",
+                        "payment_method": "stripe",
+                    },
+                )
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        delay.assert_called_once_with(response.data["id"])
+        return response
+
+    def test_create_returns_pending_payment(self):
+        """Проверка, что создание платежа не обращается к Stripe в запросе"""
+        response = self._create_payment()
+        self.assertEqual(self.gateway.calls, [])
+        self.assertEqual(response.data["payment_status"], "pending")
+        self.assertIsNone(response.data["stripe_payment_link"])
+        self.assertTrue(response["Location"].endswith("/status/"))
+
+    def test_task_fills_stripe_fields(self):
+        """Проверка заполнения ссылки на оплату фоновой задачей"""
+        payment_id = self._create_payment().data["id"]
+        create_payment_session(payment_id)
+        create_payment_session(payment_id)
+        calls = self.gateway.calls
+        self.assertEqual([call[0] for call in calls], ["prod", "price", "cs"])
+        self.assertEqual(calls[1][1]["unit_amount"], 1050)
+        self.assertEqual(
+            calls[2][1]["idempotency_key"], f"session:payment:{payment_id}"
+        )
+
+        response = self.client.get(
+            reverse("users:payments-payment-status", kwargs={"pk": payment_id})
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["payment_status"], "pending")
+        self.assertEqual(
+            response.data["stripe_payment_link"], "https://checkout.stripe.test/cs_3"
+        )
+
+    def test_stripe_error_marks_payment_failed(self):
+        """Проверка перевода платежа в статус ошибки при отказе Stripe"""
+        payment_id = self._create_payment().data["id"]
+        with mock.patch.object(
+            self.gateway,
+            "create_price",
+            side_effect=stripe.InvalidRequestError("Неверная цена", None),
+        ):
+            create_payment_session(payment_id)
+        payment = Payments.objects.get(pk=payment_id)
+        self.assertEqual(payment.payment_status, "failed")
+        self.assertIsNone(payment.stripe_session_id)
+        self.assertTrue(StripeProduct.objects.filter(course=self.course).exists())
+
+    def test_deleted_material_marks_payment_failed(self):
+        """Проверка отказа в оплате, если курс удален до создания сессии"""
+        payment_id = self._create_payment().data["id"]
+        self.course.delete()
+        create_payment_session(payment_id)
+        payment = Payments.objects.get(pk=payment_id)
+        self.assertEqual(payment.payment_status, "failed")
+        self.assertEqual(payment.stripe_error, "Оплачиваемый курс или урок удален")
+        self.assertEqual(self.gateway.calls, [])
+
+    def test_repeat_payment_reuses_product_and_price(self):
+        """Проверка, что повторный платеж за курс создает в Stripe только сессию"""
+        create_payment_session(self._create_payment().data["id"])
+        # Сброс LRU: соответствия должны читаться из БД
+        stripe_ids.clear()
+        create_payment_session(self._create_payment().data["id"])
+        create_payment_session(self._create_payment().data["id"])
+        self.assertEqual(
+            [call[0] for call in self.gateway.calls],
+            ["prod", "price", "cs", "cs", "cs"],
+        )
+        self.assertEqual(
+            set(Payments.objects.values_list("stripe_price_id", flat=True)),
+            {"price_2"},
+        )
+
+    def test_concurrent_product_creation(self):
+        """Проверка, что при гонке используется продукт, сохраненный первым"""
+
+        def create_concurrently(name, idempotency_key=None):
+            StripeProduct.objects.create(course=self.course, product_id="prod_first")
+            return SimpleNamespace(id="prod_second")
+
+        with mock.patch.object(
+            self.gateway, "create_product", side_effect=create_concurrently
+        ):
+            self.assertEqual(get_stripe_product_id(self.course), "prod_first")
+        self.assertEqual(StripeProduct.objects.count(), 1)
+
+
+class StripeGatewayTestCase(TestCase):
+    @override_settings(STRIPE_API_KEY="sk_test_gateway", STRIPE_TIMEOUT=3)
+    def test_client_created_once_on_first_use(self):
+        """Проверка ленивого создания одного клиента Stripe с пулом соединений"""
+        gateway = StripeGateway()
+        self.assertIsNone(gateway._client)
+        client = gateway.client
+        self.assertIs(gateway.client, client)
+        self.assertIsInstance(client._requestor._client, stripe.RequestsClient)
+
+
+def stripe_event(event_id, event_type, session_id, payment_status="paid"):
+    return {
+        "id": event_id,
+        "type": event_type,
+        "data": {
+            "object": {
+                "id": session_id,
+                "object": "checkout.session",
+                "payment_status": payment_status,
+            }
+        },
+    }
+
+
+@override_settings(STRIPE_WEBHOOK_SECRET="whsec_test", STRIPE_EVENTS_BATCH_SIZE=1000)
+class StripeWebhookTestCase(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(email="payer@mail.com")
+
+    def _post(self, event, secret="whsec_test"):
+        payload = json.dumps(event)
+        timestamp = int(time.time())
+        signature = hmac.new(
+            secret.encode(), f"{timestamp}.{payload}".encode(), sha256
+        ).hexdigest()
+        return self.client.post(
+            reverse("users:stripe_webhook"),
+            payload,
+            content_type="application/json",
+            HTTP_STRIPE_SIGNATURE=f"t={timestamp},v1={signature}",
+        )
+
+    def test_webhook_stores_event_once(self):
+        """Проверка сохранения события без повторов и отложенного применения"""
+        event = stripe_event("evt_1", "checkout.session.completed", "cs_1")
+        with mock.patch("users.tasks.apply_stripe_events.apply_async") as apply:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.assertEqual(self._post(event).status_code, status.HTTP_200_OK)
+                self.assertEqual(self._post(event).status_code, status.HTTP_200_OK)
+        self.assertEqual(StripeEvent.objects.get().session_id, "cs_1")
+        apply.assert_called_once()
+
+    def test_webhook_rejects_bad_signature(self):
+        """Проверка отказа при неверной подписи"""
+        event = stripe_event("evt_1", "checkout.session.completed", "cs_1")
+        response = self._post(event, secret="whsec_other")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(StripeEvent.objects.exists())
+
+    def test_webhook_rejects_invalid_event(self):
+        """Проверка отказа без секрета и для события без id или type"""
+        event = stripe_event("evt_1", "checkout.session.completed", "cs_1")
+        with override_settings(STRIPE_WEBHOOK_SECRET=""):
+            with self.assertLogs("users.services", level="ERROR"):
+                response = self._post(event)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        del event["type"]
+        response = self._post(event)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(StripeEvent.objects.exists())
+
+    def test_unmatched_events_logged(self):
+        """Проверка записи в лог событий для сессий без платежа"""
+        store_stripe_events(
+            [stripe_event("evt_1", "checkout.session.completed", "cs_missing")]
+        )
+        with self.assertLogs("users.tasks", level="WARNING") as logs:
+            apply_stripe_events()
+        self.assertIn("cs_missing", logs.output[0])
+
+    def test_delayed_payment_failure(self):
+        """Проверка, что завершенная неоплаченная сессия не блокирует отказ в оплате"""
+        payment = Payments.objects.create(
+            user=self.user,
+            payment_amount=10,
+            payment_method="stripe",
+            stripe_session_id="cs_delayed",
+        )
+        store_stripe_events(
+            [
+                stripe_event(
+                    "evt_1", "checkout.session.completed", "cs_delayed", "unpaid"
+                )
+            ]
+        )
+        apply_stripe_events()
+        payment.refresh_from_db()
+        self.assertEqual(payment.payment_status, "pending")
+
+        store_stripe_events(
+            [
+                stripe_event(
+                    "evt_2",
+                    "checkout.session.async_payment_failed",
+                    "cs_delayed",
+                    "unpaid",
+                )
+            ]
+        )
+        apply_stripe_events()
+        payment.refresh_from_db()
+        self.assertEqual(payment.payment_status, "failed")
+
+    def test_replay_events_from_file(self):
+        """Проверка применения 10 000 событий из файла с повторами"""
+        Payments.objects.bulk_create(
+            Payments(
+                user=self.user,
+                payment_amount=10,
+                payment_method="stripe",
+                stripe_session_id=f"cs_{number}",
+            )
+            for number in range(4000)
+        )
+        events = [
+            stripe_event(
+                f"evt_expired_{number}", "checkout.session.expired", f"cs_{number}"
+            )
+            for number in range(4000)
+        ]
+        events += [
+            stripe_event(
+                f"evt_paid_{number}", "checkout.session.completed", f"cs_{number}"
+            )
+            for number in range(0, 4000, 2)
+        ]
+        # Истечение после оплаты не отменяет оплаченный платеж
+        events += [
+            stripe_event(
+                f"evt_late_{number}", "checkout.session.expired", f"cs_{number}"
+            )
+            for number in range(0, 4000, 4)
+        ]
+        events += events[:3000]
+        self.assertEqual(len(events), 10_000)
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "events.jsonl")
+            with open(path, "w", encoding="utf-8") as file:
+                file.writelines(json.dumps(event) + "\n" for event in events)
+            call_command("replay_stripe_events", path, stdout=io.StringIO())
+
+        self.assertEqual(StripeEvent.objects.count(), 7000)
+        self.assertFalse(StripeEvent.objects.filter(processed_at__isnull=True).exists())
+        self.assertEqual(Payments.objects.filter(payment_status="paid").count(), 2000)
+        self.assertEqual(
+            Payments.objects.filter(payment_status="canceled").count(), 2000
+        )
+
+
+@override_settings(PROFILE_PAYMENTS_LIMIT=3)
+class PaymentHistoryTestCase(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create(email="buyer@mail.com")
+        self.payments = Payments.objects.bulk_create(
+            Payments(user=self.user, payment_amount=number, payment_method="cash")
+            for number in range(1, 8)
+        )
+        self.client.force_authenticate(user=self.user)
+
+    def test_profile_embeds_recent_payments(self):
+        """Проверка, что профиль содержит только последние платежи и их число"""
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(
+                reverse("users:profile", kwargs={"pk": self.user.pk})
+            )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        history = response.data["payment_history"]
+        self.assertEqual(history["count"], 7)
+        self.assertEqual(
+            [payment["id"] for payment in history["results"]],
+            [payment.pk for payment in self.payments[:-4:-1]],
+        )
+        payment_queries = [
+            query
+            for query in queries.captured_queries
+            if 'FROM "users_payments"' in query["sql"]
+        ]
+        self.assertEqual(len(payment_queries), 1)
+
+    def test_profile_payments_keyset_pages(self):
+        """Проверка постраничного получения полной истории платежей"""
+        Payments.objects.create(
+            user=User.objects.create(email="other@mail.com"),
+            payment_amount=1,
+            payment_method="cash",
+        )
+        url = reverse("users:profile_payments")
+        ids = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            ids += [payment["id"] for payment in response.data["results"]]
+            url = response.data["next"]
+        self.assertEqual(ids, [payment.pk for payment in reversed(self.payments)])
+
+
+class ProfileCacheTestCase(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(email="viewer@mail.com")
+        self.other = User.objects.create(email="author@mail.com", city="Москва")
+        self.client.force_authenticate(user=self.user)
+
+    def test_public_profile_from_cache(self):
+        """Проверка чтения чужого профиля из кэша без запросов"""
+        url = reverse("users:profile", kwargs={"pk": self.other.pk})
+        self.assertEqual(self.client.get(url).data["city"], "Москва")
+        with self.assertNumQueries(0):
+            response = self.client.get(url)
+        self.assertEqual(response.data["email"], "author@mail.com")
+
+        self.other.city = "Казань"
+        self.other.avatar = "users/avatars/author.png"
+        with self.captureOnCommitCallbacks(execute=True):
+            self.other.save()
+        response = self.client.get(url)
+        self.assertEqual(response.data["city"], "Казань")
+        self.assertEqual(
+            response.data["avatar"], "http://testserver/media/users/avatars/author.png"
+        )
+
+    def test_missing_profile(self):
+        """Проверка ответа 404 для несуществующего пользователя"""
+        url = reverse("users:profile", kwargs={"pk": self.other.pk + 100})
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_own_profile_loads_user_once(self):
+        """Проверка однократной загрузки пользователя при просмотре своего профиля"""
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(
+                reverse("users:profile", kwargs={"pk": self.user.pk})
+            )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn("payment_history", response.data)
+        user_queries = [
+            query
+            for query in queries.captured_queries
+            if 'FROM "users_user"' in query["sql"]
+        ]
+        self.assertEqual(len(user_queries), 1)
+
+
+class UserListTestCase(APITestCase):
+    def setUp(self):
+        self.admin = User.objects.create(email="admin@mail.com", is_staff=True)
+        User.objects.bulk_create(
+            User(email=f"user{number}@mail.com") for number in range(5)
+        )
+        self.client.force_authenticate(user=self.admin)
+
+    def test_list_is_paginated(self):
+        """Проверка курсорной пагинации списка пользователей"""
+        response = self.client.get(reverse("users:users_list"), {"page_size": 4})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data["results"]), 4)
+        self.assertIsNotNone(response.data["next"])
+
+    @override_settings(USER_LIST_STREAM_CHUNK_SIZE=2)
+    def test_list_stream_ndjson(self):
+        """Проверка потоковой выгрузки всех пользователей в формате NDJSON"""
+        response = self.client.get(reverse("users:users_list"), {"stream": "ndjson"})
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+        lines = b"".join(response.streaming_content).decode().splitlines()
+        self.assertEqual(
+            [json.loads(line)["email"] for line in lines],
+            list(User.objects.order_by("id").values_list("email", flat=True)),
+        )
+
+
+class PaymentSummaryTestCase(APITestCase):
+    def setUp(self):
+        self.admin = User.objects.create(email="admin@mail.com", is_staff=True)
+        self.course = Course.objects.create(name="Курс")
+        self.client.force_authenticate(user=self.admin)
+
+    def _pay(self, amount, **kwargs):
+        return Payments.objects.create(
+            user=self.admin,
+            paid_course=self.course,
+            payment_amount=amount,
+            payment_method="stripe",
+            **kwargs,
+        )
+
+    def _report(self, **params):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse("users:payments_summary"), params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertFalse(
+            any(
+                'FROM "users_payments"' in query["sql"]
+                for query in queries.captured_queries
+            )
+        )
+        return response.data
+
+    def test_summary_follows_payment_changes(self):
+        """Проверка обновления сводки при создании, смене статуса и удалении"""
+        first = self._pay(100)
+        self._pay(50, stripe_session_id="cs_1")
+        third = self._pay(30)
+
+        first.payment_status = "paid"
+        first.save()
+        third.delete()
+        with transaction.atomic():
+            update_payments_status(
+                Payments.objects.filter(stripe_session_id="cs_1"), "paid"
+            )
+
+        report = self._report(group_by="course_id,payment_status")
+        self.assertEqual(
+            [
+                (row["payment_status"], row["payments_count"], row["revenue"])
+                for row in report
+            ],
+            [("paid", 2, "150.00")],
+        )
+        self.assertEqual(PaymentSummary.objects.get(payment_status="paid").revenue, 150)
+
+    def test_rebuild_matches_incremental(self):
+        """Проверка, что пересчет совпадает с накопленной сводкой"""
+        self._pay(100)
+        self._pay(20, payment_status="paid")
+        Payments.objects.create(
+            user=self.admin, payment_amount=5, payment_method="cash"
+        )
+        incremental = self._report(group_by="course_id,payment_method,payment_status")
+
+        call_command("rebuild_payment_summary", stdout=io.StringIO())
+        self.assertEqual(
+            self._report(group_by="course_id,payment_method,payment_status"),
+            incremental,
+        )
+        self.assertEqual(len(incremental), 3)
+
+    def test_summary_after_material_delete(self):
+        """Проверка сводки после удаления оплаченных курса и урока"""
+        lesson = Lesson.objects.create(name="Урок", course=self.course)
+        course_payment = self._pay(10)
+        lesson_payment = self._pay(5, paid_lesson=lesson)
+        lesson.delete()
+        self.course.delete()
+
+        for payment in (course_payment, lesson_payment):
+            payment.refresh_from_db()
+            payment.payment_status = "paid"
+            payment.save()
+
+        self.assertEqual(
+            list(
+                PaymentSummary.objects.exclude(payments_count=0).values_list(
+                    "course_id",
+                    "lesson_id",
+                    "payment_status",
+                    "payments_count",
+                    "revenue",
+                )
+            ),
+            [(0, 0, "paid", 2, 15)],
+        )
+
+    def test_date_range_filter(self):
+        """Проверка фильтра по диапазону дат"""
+        self._pay(100)
+        today = timezone.localdate()
+        self.assertEqual(len(self._report(date_from=today, date_to=today)), 1)
+        self.assertEqual(self._report(date_from=today + timedelta(days=1)), [])
+
+    def test_invalid_group_by(self):
+        """Проверка отказа при недопустимом поле группировки"""
+        response = self.client.get(
+            reverse("users:payments_summary"), {"group_by": "user"}
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class BulkSubscriptionTestCase(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(email="student@mail.com")
+        self.courses = Course.objects.bulk_create(
+            Course(name=f"Курс {number}") for number in range(30)
+        )
+        self.ids = [course.pk for course in self.courses]
+        Subscription.objects.create(user=self.user, course=self.courses[0])
+        self.client.force_authenticate(user=self.user)
+        self.url = reverse("users:subscriptions_bulk")
+
+    def test_bulk_subscribe_and_unsubscribe(self):
+        """Проверка пакетной подписки и отписки с обновлением счетчиков"""
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(
+                self.url,
+                {"subscribe": self.ids[:20], "unsubscribe": self.ids[20:]},
+                format="json",
+            )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["added"], self.ids[1:20])
+        self.assertEqual(response.data["removed"], [])
+        self.assertEqual(response.data["subscribed"], self.ids[:20])
+        # Число запросов не зависит от количества курсов
+        self.assertLess(len(queries.captured_queries), 10)
+
+        response = self.client.post(
+            self.url, {"unsubscribe": self.ids[:5]}, format="json"
+        )
+        self.assertEqual(response.data["removed"], self.ids[:5])
+        self.assertEqual(response.data["subscribed"], self.ids[5:20])
+        self.assertEqual(
+            list(
+                Course.objects.filter(pk__in=self.ids[:6])
+                .order_by("pk")
+                .values_list("subscribers_count", flat=True)
+            ),
+            [0, 0, 0, 0, 0, 1],
+        )
+
+    def test_unknown_course(self):
+        """Проверка отказа при несуществующем курсе"""
+        response = self.client.post(
+            self.url, {"subscribe": [self.ids[-1] + 1]}, format="json"
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(
+            Subscription.objects.filter(course_id__gt=self.ids[0]).exists()
+        )
+
+    def test_same_course_in_both_lists(self):
+        """Проверка отказа, если курс указан и в подписке, и в отписке"""
+        response = self.client.post(
+            self.url,
+            {"subscribe": [self.ids[1]], "unsubscribe": [self.ids[1]]},
+            format="json",
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
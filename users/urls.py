@@ -5,12 +5,16 @@ from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
 
 from users.apps import UsersConfig
 from users.views import (
+    BulkSubscriptionAPIView,
+    PaymentSummaryAPIView,
     PaymentViewSet,
     UserCreateAPIView,
     UserDeleteAPIView,
     UserListAPIView,
+    UserPaymentListAPIView,
     UserRetrieveAPIView,
     UserUpdateAPIView,
+    StripeWebhookAPIView,
     SubscriptionAPIView,
 )
 
@@ -24,6 +28,11 @@ urlpatterns = [
     path("profile/<int:pk>/", UserRetrieveAPIView.as_view(), name="profile"),
     path("profile/update/", UserUpdateAPIView.as_view(), name="profile_update"),
     path("profile/delete/", UserDeleteAPIView.as_view(), name="profile_delete"),
+    path(
+        "profile/payments/",
+        UserPaymentListAPIView.as_view(),
+        name="profile_payments",
+    ),
     path("register/", UserCreateAPIView.as_view(), name="register"),
     path(
         "login/",
@@ -35,5 +44,12 @@ urlpatterns = [
         TokenRefreshView.as_view(permission_classes=[AllowAny]),
         name="token_refresh",
     ),
+    path("payments/summary/", PaymentSummaryAPIView.as_view(), name="payments_summary"),
     path("subscriptions/", SubscriptionAPIView.as_view(), name="subscriptions"),
+    path(
+        "subscriptions/bulk/",
+        BulkSubscriptionAPIView.as_view(),
+        name="subscriptions_bulk",
+    ),
+    path("stripe/webhook/", StripeWebhookAPIView.as_view(), name="stripe_webhook"),
 ] + router.urls
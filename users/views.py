@@ -1,9 +1,19 @@
+import json
+from itertools import islice
+
+import stripe
+from django.conf import settings
+from django.db import transaction
+from django.http import StreamingHttpResponse
 from django.shortcuts import get_object_or_404
 from django.utils.decorators import method_decorator
 from django_filters.rest_framework import DjangoFilterBackend
 from drf_yasg import openapi
 from drf_yasg.utils import swagger_auto_schema
-from rest_framework import status, serializers
+from django.db.models import Sum
+from rest_framework import status
+from rest_framework.exceptions import ValidationError
+from rest_framework.decorators import action
 from rest_framework.filters import OrderingFilter
 from rest_framework.generics import (
     CreateAPIView,
@@ -14,22 +24,38 @@ from rest_framework.generics import (
 )
 from rest_framework.permissions import AllowAny, IsAdminUser, IsAuthenticated
 from rest_framework.response import Response
+from rest_framework.reverse import reverse
+from rest_framework.utils.encoders import JSONEncoder
 from rest_framework.views import APIView
 from rest_framework.viewsets import ModelViewSet
 
 from materials.models import Course
-from users.models import Payments, User, Subscription
+from materials.paginations import (
+    CustomPagination,
+    PaginationModeMixin,
+    PaymentKeysetPagination,
+    UserKeysetPagination,
+)
+from users.cache import get_public_profile
+from users.filters import PaymentSummaryFilter
+from users.models import Payments, PaymentSummary, User, Subscription
 from users.permissions import IsProfileOwner
 from users.serializers import (
+    BulkSubscriptionSerializer,
+    PaymentHistorySerializer,
     PaymentSerializer,
+    PaymentStatusSerializer,
+    PaymentSummarySerializer,
     UserPrivateSerializer,
     UserPublicSerializer,
 )
 from users.services import (
-    create_stripe_product,
-    create_stripe_price,
-    create_stripe_session,
+    parse_webhook,
+    schedule_stripe_events,
+    store_stripe_events,
 )
+from users.subscriptions import apply_subscriptions, lock_user_subscriptions
+from users.tasks import create_payment_session
 
 
 @method_decorator(
@@ -75,13 +101,22 @@ class UserRetrieveAPIView(RetrieveAPIView):
 
     queryset = User.objects.all()
 
+    def retrieve(self, request, *args, **kwargs):
+        # Чужой профиль отдается из кэша публичных представлений без запросов к БД
+        if self.kwargs.get("pk") != request.user.pk:
+            data = get_public_profile(self.kwargs.get("pk"))
+            if data["avatar"]:
+                data = {**data, "avatar": request.build_absolute_uri(data["avatar"])}
+            return Response(data)
+        return super().retrieve(request, *args, **kwargs)
+
     def get_serializer_class(self):
         # Используем get_object_or_404 для безопасного получения объекта
         if getattr(self, "swagger_fake_view", False):
             return UserPublicSerializer  # Для генерации схемы Swagger
 
         obj = self.get_object()
-        if self.request.user == obj:
+        if self.request.user.pk == obj.pk:
             return UserPrivateSerializer
         return UserPublicSerializer
 
@@ -89,8 +124,10 @@ class UserRetrieveAPIView(RetrieveAPIView):
         if getattr(self, "swagger_fake_view", False):
             return None  # Для генерации схемы Swagger
 
-        pk = self.kwargs.get("pk")
-        return get_object_or_404(User, pk=pk)
+        # Объект запрашивается и в get_serializer_class, и в retrieve
+        if not hasattr(self, "_object"):
+            self._object = get_object_or_404(User, pk=self.kwargs.get("pk"))
+        return self._object
 
 
 @method_decorator(
@@ -112,21 +149,65 @@ class UserUpdateAPIView(UpdateAPIView):
     permission_classes = [IsAuthenticated, IsProfileOwner]
 
     def get_object(self):
-        return self.request.user
+        # request.user может быть закэширован аутентификацией, профиль читается из БД
+        return get_object_or_404(User, pk=self.request.user.pk)
 
 
 @method_decorator(
     name="get",
     decorator=swagger_auto_schema(
-        operation_description="Получение списка пользователей. Доступно только администраторам."
+        operation_description="История платежей текущего пользователя "
+        "с курсорной пагинацией, начиная с последних."
+    ),
+)
+class UserPaymentListAPIView(ListAPIView):
+    """API для просмотра полной истории платежей пользователя."""
+
+    serializer_class = PaymentHistorySerializer
+    pagination_class = PaymentKeysetPagination
+    permission_classes = [IsAuthenticated]
+
+    def get_queryset(self):
+        return Payments.objects.filter(user_id=self.request.user.pk).only(
+            *PaymentHistorySerializer.Meta.fields
+        )
+
+
+@method_decorator(
+    name="get",
+    decorator=swagger_auto_schema(
+        operation_description="Получение списка пользователей с курсорной пагинацией. "
+        "С параметром ?stream=ndjson возвращает всех пользователей потоком, "
+        "по одному JSON-объекту в строке. Доступно только администраторам."
     ),
 )
 class UserListAPIView(ListAPIView):
     """API для просмотра списка пользователей."""
 
     serializer_class = UserPublicSerializer
-    queryset = User.objects.all()
+    queryset = User.objects.only(*UserPublicSerializer.Meta.fields)
     permission_classes = [IsAdminUser]
+    pagination_class = UserKeysetPagination
+
+    def list(self, request, *args, **kwargs):
+        if request.query_params.get("stream") == "ndjson":
+            return StreamingHttpResponse(
+                self.stream_ndjson(), content_type="application/x-ndjson"
+            )
+        return super().list(request, *args, **kwargs)
+
+    def stream_ndjson(self):
+        """
+        Читает пользователей серверным курсором и сериализует их пачками,
+        поэтому в памяти одновременно находится не больше одной пачки.
+        """
+        chunk_size = settings.USER_LIST_STREAM_CHUNK_SIZE
+        users = self.get_queryset().order_by("id").iterator(chunk_size=chunk_size)
+        while chunk := list(islice(users, chunk_size)):
+            yield "".join(
+                json.dumps(item, cls=JSONEncoder, ensure_ascii=False) + "\n"
+                for item in self.get_serializer(chunk, many=True).data
+            )
 
 
 @method_decorator(
@@ -142,7 +223,7 @@ class UserDeleteAPIView(DestroyAPIView):
     permission_classes = [IsAuthenticated]
 
     def get_object(self):
-        return self.request.user
+        return get_object_or_404(User, pk=self.request.user.pk)
 
     def destroy(self, request, *args, **kwargs):
         instance = self.get_object()
@@ -156,7 +237,10 @@ class UserDeleteAPIView(DestroyAPIView):
 )
 @method_decorator(
     name="create",
-    decorator=swagger_auto_schema(operation_description="Создание записи о платеже."),
+    decorator=swagger_auto_schema(
+        operation_description="Создание записи о платеже. Ссылка на оплату в Stripe "
+        "создается в фоне, ее можно получить через /payments/{id}/status/."
+    ),
 )
 @method_decorator(
     name="retrieve",
@@ -176,34 +260,96 @@ class UserDeleteAPIView(DestroyAPIView):
     name="destroy",
     decorator=swagger_auto_schema(operation_description="Удаление записи о платеже."),
 )
-class PaymentViewSet(ModelViewSet):
+class PaymentViewSet(PaginationModeMixin, ModelViewSet):
     """ViewSet для работы с платежами."""
 
     queryset = Payments.objects.all()
     serializer_class = PaymentSerializer
+    pagination_class = CustomPagination
+    cursor_pagination_class = PaymentKeysetPagination
+
+    def create(self, request, *args, **kwargs):
+        # Ссылка на оплату появится после выполнения create_payment_session,
+        # клиент узнает о ней через действие status
+        response = super().create(request, *args, **kwargs)
+        response.status_code = status.HTTP_202_ACCEPTED
+        response["Location"] = reverse(
+            "users:payments-payment-status",
+            kwargs={"pk": response.data["id"]},
+            request=request,
+        )
+        return response
 
     def perform_create(self, serializer):
-        try:
-            payment = serializer.save(user=self.request.user)
-            product = create_stripe_product(payment.paid_course)
-            price = create_stripe_price(payment.payment_amount, product.id)
-            session = create_stripe_session(price.id)
-
-            payment.stripe_product_id = product.id
-            payment.stripe_price_id = price.id
-            payment.stripe_session_id = session.id
-            payment.stripe_payment_link = session.url
-            payment.save()
-
-        except Exception as e:
-            print(f"Error during payment creation: {str(e)}")
-            raise serializers.ValidationError(f"Ошибка при создании платежа: {str(e)}")
+        payment = serializer.save(user=self.request.user, payment_status="pending")
+        transaction.on_commit(lambda: create_payment_session.delay(payment.pk))
+
+    @action(
+        detail=True,
+        methods=["get"],
+        url_path="status",
+        url_name="payment-status",
+        serializer_class=PaymentStatusSerializer,
+    )
+    def payment_status(self, request, pk=None):
+        """Статус платежа и ссылка на оплату после ее создания в Stripe."""
+        return Response(self.get_serializer(self.get_object()).data)
 
     filter_backends = [DjangoFilterBackend, OrderingFilter]
     filterset_fields = ["paid_course", "paid_lesson", "payment_method"]
     ordering_fields = ["payment_date"]
 
 
+group_by_param = openapi.Parameter(
+    "group_by",
+    openapi.IN_QUERY,
+    description="Поля группировки через запятую: course_id, lesson_id, day, "
+    "payment_method, payment_status. По умолчанию day.",
+    type=openapi.TYPE_STRING,
+)
+
+
+@method_decorator(
+    name="get",
+    decorator=swagger_auto_schema(
+        manual_parameters=[group_by_param],
+        operation_description="Отчет по выручке из сводки платежей с фильтрами "
+        "date_from, date_to, course_id, lesson_id, payment_method, payment_status. "
+        "Доступно только администраторам.",
+    ),
+)
+class PaymentSummaryAPIView(ListAPIView):
+    """API для отчетов по выручке. Читает только сводку, не таблицу платежей."""
+
+    # Строки с нулевым числом платежей остаются после смены статуса
+    queryset = PaymentSummary.objects.exclude(payments_count=0)
+    serializer_class = PaymentSummarySerializer
+    permission_classes = [IsAdminUser]
+    filter_backends = [DjangoFilterBackend]
+    filterset_class = PaymentSummaryFilter
+    group_by_fields = (
+        "course_id",
+        "lesson_id",
+        "day",
+        "payment_method",
+        "payment_status",
+    )
+
+    def filter_queryset(self, queryset):
+        group_by = self.request.query_params.get("group_by", "day").split(",")
+        if not set(group_by) <= set(self.group_by_fields):
+            raise ValidationError(
+                {"group_by": f"Допустимые поля: {', '.join(self.group_by_fields)}"}
+            )
+        return (
+            super()
+            .filter_queryset(queryset)
+            .values(*group_by)
+            .annotate(payments_count=Sum("payments_count"), revenue=Sum("revenue"))
+            .order_by(*group_by)
+        )
+
+
 @method_decorator(
     name="post",
     decorator=swagger_auto_schema(
@@ -223,16 +369,65 @@ class SubscriptionAPIView(APIView):
             )
         course_item = get_object_or_404(Course, id=course_id)
 
-        subs_item, created = Subscription.objects.get_or_create(
-            user=user,
-            course=course_item,
-            defaults={"user": user, "course": course_item},
-        )
+        # Та же блокировка, что и у пакетного изменения подписок
+        with transaction.atomic():
+            lock_user_subscriptions(user.pk)
+            subs_item, created = Subscription.objects.get_or_create(
+                user=user,
+                course=course_item,
+                defaults={"user": user, "course": course_item},
+            )
 
-        if not created:
-            subs_item.delete()
-            message = "Подписка удалена"
-        else:
-            message = "Подписка добавлена"
+            if not created:
+                subs_item.delete()
+                message = "Подписка удалена"
+            else:
+                message = "Подписка добавлена"
 
         return Response({"message": message}, status=status.HTTP_200_OK)
+
+
+@method_decorator(
+    name="post",
+    decorator=swagger_auto_schema(
+        request_body=BulkSubscriptionSerializer,
+        operation_description="Пакетная подписка и отписка: курсы из subscribe "
+        "добавляются, из unsubscribe удаляются в одной транзакции. "
+        "Возвращает добавленные, удаленные и все текущие подписки.",
+    ),
+)
+class BulkSubscriptionAPIView(APIView):
+    """API для пакетного управления подписками на курсы."""
+
+    def post(self, request):
+        serializer = BulkSubscriptionSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        return Response(
+            apply_subscriptions(request.user, **serializer.validated_data),
+            status=status.HTTP_200_OK,
+        )
+
+
+@method_decorator(
+    name="post",
+    decorator=swagger_auto_schema(
+        operation_description="Прием событий Stripe. Подпись проверяется по "
+        "STRIPE_WEBHOOK_SECRET, события применяются к платежам в фоне."
+    ),
+)
+class StripeWebhookAPIView(APIView):
+    """API для приема вебхуков Stripe."""
+
+    authentication_classes = []
+    permission_classes = [AllowAny]
+
+    def post(self, request):
+        try:
+            event = parse_webhook(
+                request.body, request.META.get("HTTP_STRIPE_SIGNATURE", "")
+            )
+        except (stripe.SignatureVerificationError, ValueError):
+            return Response(status=status.HTTP_400_BAD_REQUEST)
+        store_stripe_events([event])
+        schedule_stripe_events()
+        return Response(status=status.HTTP_200_OK)